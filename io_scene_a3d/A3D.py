@@ -20,9 +20,16 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 '''
 
-from .IOTools import unpackStream, readNullTerminatedString, calculatePadding
+from logging import getLogger
+from array import array
+from mmap import mmap, ACCESS_READ
+from time import perf_counter
+
+from .IOTools import BufferStream, toArray, writeArray, UINT16x2, UINT32x2, UINT32x3, calculatePadding
 from . import A3DObjects
 
+logger = getLogger(__name__)
+
 '''
 A3D constants
 '''
@@ -32,6 +39,7 @@ A3D_MATERIALBLOCK_SIGNATURE = 4
 A3D_MESHBLOCK_SIGNATURE = 2
 A3D_TRANSFORMBLOCK_SIGNATURE = 3
 A3D_OBJECTBLOCK_SIGNATURE = 5
+A3D_NOPARENT = 0xFFFFFFFF
 
 '''
 A3D model object
@@ -40,22 +48,37 @@ class A3D:
     def __init__(self):
         self.materials = []
         self.meshes = []
-        self.transforms = []
+        self.transforms = A3DObjects.A3DTransformList()
         self.objects = []
-        self.parentIds = []
+        self.parentIds = array("I")
+        self.version = None
+
+        # Only index mesh payloads while reading and decode them on first access
+        self.lazy = False
+
+        # Opt-in time spent per data block, block name -> seconds
+        self.collectTimings = False
+        self.blockTimings = {}
 
     '''
     Main IO
     '''
-    def read(self, stream):
+    def read(self, stream, lazy=False):
+        if not isinstance(stream, BufferStream):
+            # The block readers work on an in memory cursor, one big read is far cheaper than many small ones anyway.
+            # Only readMapped hands out views, data read from a file object comes back as regular (writable) arrays
+            stream = BufferStream(stream.read(), copyArrays=True)
+        self.lazy = lazy
+
         # Check signature
         signature = stream.read(4)
         if signature != A3D_SIGNATURE:
-            raise RuntimeError(f"Invalid A3D signature: {signature}")
+            raise RuntimeError(f"Invalid A3D signature: {bytes(signature)}")
         
         # Read file version and read version specific data
-        version, _ = unpackStream("<2H", stream) # Likely major.minor version code
-        print(f"Reading A3D version {version}")
+        version, _ = stream.unpack(UINT16x2) # Likely major.minor version code
+        self.version = version
+        logger.debug("Reading A3D version %s", version)
         
         if version == 1:
             self.readRootBlock1(stream)
@@ -64,6 +87,143 @@ class A3D:
         elif version == 3:
             self.readRootBlock3(stream)
 
+        if self.collectTimings:
+            summary = ", ".join(f"{name} {seconds*1000:.2f}ms" for name, seconds in self.blockTimings.items())
+            logger.info("Read A3D version %s blocks: %s", version, summary)
+
+    def write(self, stream, version=None):
+        # Blocks are written one after another straight to the stream, their lengths are worked out up front
+        if version == None:
+            version = self.version if self.version != None else 3
+
+        stream.write(A3D_SIGNATURE)
+        stream.write(UINT16x2.pack(version, 0))
+        if version == 2:
+            self.writeRootBlock2(stream)
+        elif version == 3:
+            self.writeRootBlock3(stream)
+        else:
+            raise RuntimeError(f"Writing version {version} files is not supported")
+
+    '''
+    Material assignments, version 2 keeps them on the submeshes and version 3
+    on the objects. Writing either version fills in the side the other version
+    left out without changing the model
+    '''
+    def getObjectMaterialIDs(self, objec):
+        if len(objec.materialIDs) != 0 or objec.meshID >= len(self.meshes):
+            return objec.materialIDs
+        return array("i", [-1 if submesh.materialID == None else submesh.materialID for submesh in self.meshes[objec.meshID].submeshes])
+
+    def getSubmeshMaterialIDs(self):
+        # Mesh ID -> submesh material IDs, the first object using a mesh decides the ones the submeshes leave out
+        meshMaterialIDs = [[submesh.materialID for submesh in mesh.submeshes] for mesh in self.meshes]
+        for objec in self.objects:
+            if objec.meshID >= len(self.meshes):
+                continue
+            materialIDs = meshMaterialIDs[objec.meshID]
+            for submeshIndex, materialID in enumerate(objec.materialIDs[:len(materialIDs)]):
+                if materialIDs[submeshIndex] == None and materialID != -1:
+                    materialIDs[submeshIndex] = materialID
+        return meshMaterialIDs
+
+    def readMapped(self, filepath, lazy=False):
+        # Parse straight out of a memory mapping of the file, vertex data ends up as views into the mapping instead of copies
+        with open(filepath, "rb") as file:
+            mapping = mmap(file.fileno(), 0, access=ACCESS_READ)
+        self.read(BufferStream(mapping), lazy)
+
+    def readBlock(self, name, reader, stream):
+        if not self.collectTimings:
+            reader(stream)
+            return
+
+        start = perf_counter()
+        reader(stream)
+        self.blockTimings[name] = perf_counter() - start
+
+    '''
+    Validation
+    '''
+    def validate(self):
+        # Checks the decoded mesh data and the IDs the objects refer to, returns a list of problems (empty if the model is fine)
+        problems = []
+        for meshIndex, mesh in enumerate(self.meshes):
+            problems += [f"mesh {meshIndex} {problem}" for problem in mesh.validate(len(self.materials))]
+        for objectIndex, objec in enumerate(self.objects):
+            if objec.meshID >= len(self.meshes):
+                problems.append(f"object {objectIndex} mesh ID {objec.meshID} out of range (count {len(self.meshes)})")
+            if objec.transformID >= len(self.transforms):
+                problems.append(f"object {objectIndex} transform ID {objec.transformID} out of range (count {len(self.transforms)})")
+            if len(objec.materialIDs) != 0 and max(objec.materialIDs) >= len(self.materials):
+                problems.append(f"object {objectIndex} material ID {max(objec.materialIDs)} out of range (count {len(self.materials)})")
+
+        return problems
+
+    '''
+    Transform hierarchy
+    '''
+    def resolveTransformHierarchy(self):
+        '''
+        Returns the parent index of every transform (-1 for roots) and an order
+        that visits every parent before its children, parent cycles are broken
+        by turning one transform of the cycle into a root
+        '''
+        transformCount = len(self.transforms)
+        parents = array("i", [-1]) * transformCount
+        for index, parentID in enumerate(self.parentIds[:transformCount]):
+            # Out of range IDs mean no parent, some files point transforms at themselves too
+            if parentID < transformCount and parentID != index:
+                parents[index] = parentID
+
+        # Children of every transform, packed into one array with an offset per parent
+        childOffsets = array("I", [0]) * (transformCount + 1)
+        for parent in parents:
+            if parent != -1:
+                childOffsets[parent + 1] += 1
+        for index in range(transformCount):
+            childOffsets[index + 1] += childOffsets[index]
+        children = array("I", [0]) * childOffsets[transformCount]
+        childCounts = array("I", [0]) * transformCount
+        for index, parent in enumerate(parents):
+            if parent != -1:
+                children[childOffsets[parent] + childCounts[parent]] = index
+                childCounts[parent] += 1
+
+        # Breadth first from the roots, anything not reached hangs off a cycle
+        order = array("I")
+        visited = bytearray(transformCount)
+        def visit(root):
+            position = len(order)
+            order.append(root)
+            visited[root] = 1
+            while position < len(order):
+                index = order[position]
+                position += 1
+                for child in children[childOffsets[index]:childOffsets[index + 1]]:
+                    if not visited[child]:
+                        visited[child] = 1
+                        order.append(child)
+        for index in range(transformCount):
+            if parents[index] == -1:
+                visit(index)
+
+        if len(order) != transformCount:
+            walked = array("I", [0]) * transformCount
+            for index in range(transformCount):
+                if visited[index]:
+                    continue
+                # Follow the parents until a transform repeats, that one is on the cycle
+                transformID = index
+                while walked[transformID] != index + 1:
+                    walked[transformID] = index + 1
+                    transformID = parents[transformID]
+                logger.warning("Transform %s is part of a parent cycle, importing it as a root", transformID)
+                parents[transformID] = -1
+                visit(transformID)
+
+        return parents, order
+
     '''
     Root data blocks
     '''
@@ -72,44 +232,67 @@ class A3D:
 
     def readRootBlock2(self, stream):
         # Verify signature
-        signature, _ = unpackStream("<2I", stream)
+        signature, _ = stream.unpack(UINT32x2)
         if signature != A3D_ROOTBLOCK_SIGNATURE:
             raise RuntimeError(f"Invalid root data block signature: {signature}")
         
         # Read data
-        print(f"Reading root block")
-        self.readMaterialBlock2(stream)
-        self.readMeshBlock2(stream)
-        self.readTransformBlock2(stream)
-        self.readObjectBlock2(stream)
+        logger.debug("Reading root block")
+        self.readBlock("materials", self.readMaterialBlock2, stream)
+        self.readBlock("meshes", self.readMeshBlock2, stream)
+        self.readBlock("transforms", self.readTransformBlock2, stream)
+        self.readBlock("objects", self.readObjectBlock2, stream)
 
     def readRootBlock3(self, stream):
         # Verify signature
-        signature, length = unpackStream("<2I", stream)
+        signature, length = stream.unpack(UINT32x2)
         if signature != A3D_ROOTBLOCK_SIGNATURE:
             raise RuntimeError(f"Invalid root data block signature: {signature}")
 
         # Read data
-        self.readMaterialBlock3(stream)
-        self.readMeshBlock3(stream)
-        self.readTransformBlock3(stream)
-        self.readObjectBlock3(stream)
+        self.readBlock("materials", self.readMaterialBlock3, stream)
+        self.readBlock("meshes", self.readMeshBlock3, stream)
+        self.readBlock("transforms", self.readTransformBlock3, stream)
+        self.readBlock("objects", self.readObjectBlock3, stream)
 
         # Padding
-        padding = calculatePadding(length)
-        stream.read(padding)
+        stream.skip(calculatePadding(length))
+
+    def writeRootBlock2(self, stream):
+        length = 4*UINT32x3.size
+        length += self.calculateMaterialBlockLength2() + self.calculateMeshBlockLength2() + self.calculateTransformBlockLength2() + self.calculateObjectBlockLength2()
+        stream.write(UINT32x2.pack(A3D_ROOTBLOCK_SIGNATURE, length))
+
+        self.writeMaterialBlock2(stream)
+        self.writeMeshBlock2(stream)
+        self.writeTransformBlock2(stream)
+        self.writeObjectBlock2(stream)
+
+    def writeRootBlock3(self, stream):
+        length = 0
+        for blockLength in (self.calculateMaterialBlockLength3(), self.calculateMeshBlockLength3(), self.calculateTransformBlockLength3(), self.calculateObjectBlockLength3()):
+            length += UINT32x3.size + blockLength + calculatePadding(blockLength)
+        stream.write(UINT32x2.pack(A3D_ROOTBLOCK_SIGNATURE, length))
+
+        self.writeMaterialBlock3(stream)
+        self.writeMeshBlock3(stream)
+        self.writeTransformBlock3(stream)
+        self.writeObjectBlock3(stream)
+
+        # Padding
+        stream.write(bytes(calculatePadding(length)))
 
     '''
     Material data blocks
     '''
     def readMaterialBlock2(self, stream):
         # Verify signature
-        signature, _, materialCount = unpackStream("<3I", stream)
+        signature, _, materialCount = stream.unpack(UINT32x3)
         if signature != A3D_MATERIALBLOCK_SIGNATURE:
             raise RuntimeError(f"Invalid material data block signature: {signature}")
         
         # Read data
-        print(f"Reading material block with {materialCount} materials")
+        logger.debug("Reading material block with %s materials", materialCount)
         for _ in range(materialCount):
             material = A3DObjects.A3DMaterial()
             material.read2(stream)
@@ -117,111 +300,160 @@ class A3D:
     
     def readMaterialBlock3(self, stream):
         # Verify signature
-        signature, length, materialCount = unpackStream("<3I", stream)
+        signature, length, materialCount = stream.unpack(UINT32x3)
         if signature != A3D_MATERIALBLOCK_SIGNATURE:
             raise RuntimeError(f"Invalid material data block signature: {signature}")
 
         # Read data
-        print(f"Reading material block with {materialCount} materials and length {length}")
+        logger.debug("Reading material block with %s materials and length %s", materialCount, length)
         for _ in range(materialCount):
             material = A3DObjects.A3DMaterial()
             material.read3(stream)
             self.materials.append(material)
 
         # Padding
-        padding = calculatePadding(length)
-        stream.read(padding)
+        stream.skip(calculatePadding(length))
+
+    def writeMaterialBlock2(self, stream):
+        stream.write(UINT32x3.pack(A3D_MATERIALBLOCK_SIGNATURE, self.calculateMaterialBlockLength2(), len(self.materials)))
+        for material in self.materials:
+            material.write2(stream)
+
+    def writeMaterialBlock3(self, stream):
+        length = self.calculateMaterialBlockLength3()
+        stream.write(UINT32x3.pack(A3D_MATERIALBLOCK_SIGNATURE, length, len(self.materials)))
+        for material in self.materials:
+            material.write3(stream)
+        stream.write(bytes(calculatePadding(length)))
+
+    def calculateMaterialBlockLength2(self):
+        return sum(material.calculateSize2() for material in self.materials)
+
+    def calculateMaterialBlockLength3(self):
+        return sum(material.calculateSize3() for material in self.materials)
 
     '''
     Mesh data blocks
     '''
     def readMeshBlock2(self, stream):
         # Verify signature
-        signature, _, meshCount = unpackStream("<3I", stream)
+        signature, _, meshCount = stream.unpack(UINT32x3)
         if signature != A3D_MESHBLOCK_SIGNATURE:
             raise RuntimeError(f"Invalid mesh data block signature: {signature}")
 
         # Read data
-        print(f"Reading mesh block with {meshCount} meshes")
+        logger.debug("Reading mesh block with %s meshes", meshCount)
         for _ in range(meshCount):
             mesh = A3DObjects.A3DMesh()
-            mesh.read2(stream)
+            mesh.read2(stream, self.lazy)
             self.meshes.append(mesh)
 
     def readMeshBlock3(self, stream):
         # Verify signature
-        signature, length, meshCount = unpackStream("<3I", stream)
+        signature, length, meshCount = stream.unpack(UINT32x3)
         if signature != A3D_MESHBLOCK_SIGNATURE:
             raise RuntimeError(f"Invalid mesh data block signature: {signature}")
 
         # Read data
-        print(f"Reading mesh block with {meshCount} meshes and length {length}")
+        logger.debug("Reading mesh block with %s meshes and length %s", meshCount, length)
         for _ in range(meshCount):
             mesh = A3DObjects.A3DMesh()
-            mesh.read3(stream)
+            mesh.read3(stream, self.lazy)
             self.meshes.append(mesh)
         
         # Padding
-        padding = calculatePadding(length)
-        stream.read(padding)
+        stream.skip(calculatePadding(length))
+
+    def writeMeshBlock2(self, stream):
+        stream.write(UINT32x3.pack(A3D_MESHBLOCK_SIGNATURE, self.calculateMeshBlockLength2(), len(self.meshes)))
+        for mesh, materialIDs in zip(self.meshes, self.getSubmeshMaterialIDs()):
+            mesh.write2(stream, materialIDs)
+
+    def writeMeshBlock3(self, stream):
+        length = self.calculateMeshBlockLength3()
+        stream.write(UINT32x3.pack(A3D_MESHBLOCK_SIGNATURE, length, len(self.meshes)))
+        for mesh in self.meshes:
+            mesh.write3(stream)
+        stream.write(bytes(calculatePadding(length)))
+
+    def calculateMeshBlockLength2(self):
+        return sum(mesh.calculateSize2() for mesh in self.meshes)
+
+    def calculateMeshBlockLength3(self):
+        return sum(mesh.calculateSize3() for mesh in self.meshes)
 
     '''
     Transform data blocks
     '''
     def readTransformBlock2(self, stream):
         # Verify signature
-        signature, _, transformCount = unpackStream("<3I", stream)
+        signature, _, transformCount = stream.unpack(UINT32x3)
         if signature != A3D_TRANSFORMBLOCK_SIGNATURE:
             raise RuntimeError(f"Invalid transform data block signature: {signature}")
 
         # Read data
-        print(f"Reading transform block with {transformCount} transforms")
-        #self.transforms = []
-        for _ in range(transformCount):
-            transform = A3DObjects.A3DTransform()
-            transform.read2(stream)
-            self.transforms.append(transform)
+        logger.debug("Reading transform block with %s transforms", transformCount)
+        # Version 2 transforms are plain float records, read them in one go
+        self.transforms.extend([""] * transformCount, stream.readArray("f", transformCount * A3DObjects.A3D_TRANSFORM_SIZE))
         # Read parents IDs
-        for _ in range(transformCount):
-            parentId, = unpackStream("<I", stream)
-            #self.transforms[transformID] = transforms[transformI]
-            self.parentIds.append(parentId)
-
+        self.parentIds += toArray("I", stream.readArray("I", transformCount))
 
     def readTransformBlock3(self, stream):
         # Verify signature
-        signature, length, transformCount = unpackStream("<3I", stream)
+        signature, length, transformCount = stream.unpack(UINT32x3)
         if signature != A3D_TRANSFORMBLOCK_SIGNATURE:
             raise RuntimeError(f"Invalid transform data block signature: {signature}")
 
         # Read data
-        print(f"Reading transform block with {transformCount} transforms and length {length}")
-        transforms = []
+        logger.debug("Reading transform block with %s transforms and length %s", transformCount, length)
         for _ in range(transformCount):
             transform = A3DObjects.A3DTransform()
             transform.read3(stream)
-            transforms.append(transform)
-        # Read and assign transform ids
-        for transformI in range(transformCount):
-            #TODO fix as in V2
-            transformID, = unpackStream("<I", stream)
-            self.transforms[transformI] = transforms[transformI] #XXX: The IDs seem to be incorrect and instead map to index?
+            self.transforms.append(transform)
+        # Read parent IDs, laid out the same as in version 2
+        self.parentIds += toArray("I", stream.readArray("I", transformCount))
 
         # Padding
-        padding = calculatePadding(length)
-        stream.read(padding)
+        stream.skip(calculatePadding(length))
+
+    def writeTransformBlock2(self, stream):
+        transformCount = len(self.transforms)
+        stream.write(UINT32x3.pack(A3D_TRANSFORMBLOCK_SIGNATURE, self.calculateTransformBlockLength2(), transformCount))
+        writeArray("f", self.transforms.data, stream)
+
+        writeArray("I", self.getParentIds(), stream)
+
+    def writeTransformBlock3(self, stream):
+        length = self.calculateTransformBlockLength3()
+        stream.write(UINT32x3.pack(A3D_TRANSFORMBLOCK_SIGNATURE, length, len(self.transforms)))
+        for transform in self.transforms:
+            transform.write3(stream)
+        writeArray("I", self.getParentIds(), stream)
+        stream.write(bytes(calculatePadding(length)))
+
+    def getParentIds(self):
+        # Models built in blender may not have any, write every transform as a root then
+        if len(self.parentIds) != len(self.transforms):
+            return array("I", [A3D_NOPARENT]) * len(self.transforms)
+        return self.parentIds
+
+    def calculateTransformBlockLength2(self):
+        return len(self.transforms) * (A3DObjects.A3D_TRANSFORM_SIZE*4 + 4)
+
+    def calculateTransformBlockLength3(self):
+        return sum(transform.calculateSize3() for transform in self.transforms) + len(self.transforms)*4
 
     '''
     Object data blocks
     '''
     def readObjectBlock2(self, stream):
         # Verify signature
-        signature, _, objectCount = unpackStream("<3I", stream)
+        signature, _, objectCount = stream.unpack(UINT32x3)
         if signature != A3D_OBJECTBLOCK_SIGNATURE:
             raise RuntimeError(f"Invalid object data block signature: {signature}")
 
         # Read data
-        print(f"Reading object block with {objectCount} objects")
+        logger.debug("Reading object block with %s objects", objectCount)
         for _ in range(objectCount):
             objec = A3DObjects.A3DObject()
             objec.read2(stream)
@@ -229,17 +461,34 @@ class A3D:
 
     def readObjectBlock3(self, stream):
         # Verify signature
-        signature, length, objectCount = unpackStream("<3I", stream)
+        signature, length, objectCount = stream.unpack(UINT32x3)
         if signature != A3D_OBJECTBLOCK_SIGNATURE:
             raise RuntimeError(f"Invalid object data block signature: {signature}")
 
         # Read data
-        print(f"Reading object block with {objectCount} objects and length {length}")
+        logger.debug("Reading object block with %s objects and length %s", objectCount, length)
         for _ in range(objectCount):
             objec = A3DObjects.A3DObject()
             objec.read3(stream)
             self.objects.append(objec)
 
         # Padding
-        padding = calculatePadding(length)
-        stream.read(padding)
\ No newline at end of file
+        stream.skip(calculatePadding(length))
+
+    def writeObjectBlock2(self, stream):
+        stream.write(UINT32x3.pack(A3D_OBJECTBLOCK_SIGNATURE, self.calculateObjectBlockLength2(), len(self.objects)))
+        for objec in self.objects:
+            objec.write2(stream)
+
+    def writeObjectBlock3(self, stream):
+        length = self.calculateObjectBlockLength3()
+        stream.write(UINT32x3.pack(A3D_OBJECTBLOCK_SIGNATURE, length, len(self.objects)))
+        for objec in self.objects:
+            objec.write3(stream, self.getObjectMaterialIDs(objec))
+        stream.write(bytes(calculatePadding(length)))
+
+    def calculateObjectBlockLength2(self):
+        return sum(objec.calculateSize2() for objec in self.objects)
+
+    def calculateObjectBlockLength3(self):
+        return sum(objec.calculateSize3(self.getObjectMaterialIDs(objec)) for objec in self.objects)
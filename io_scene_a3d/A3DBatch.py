@@ -0,0 +1,218 @@
+'''
+Copyright (c) 2024 Pyogenics <https://github.com/Pyogenics>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from logging import basicConfig, DEBUG, WARNING
+from os import chmod, cpu_count, fdopen, makedirs, remove, replace, umask, walk
+from os.path import commonpath, dirname, getsize, isdir, join, relpath
+from tempfile import mkstemp
+from time import perf_counter
+import json
+
+from .A3D import A3D
+
+'''
+Headless batch processing of A3D files, no blender required:
+
+    python -m io_scene_a3d.A3DBatch <files or directories> [--jobs N] [--report report.json] [--convert outdir --version 3]
+'''
+
+def findFiles(paths):
+    filepaths = []
+    for path in paths:
+        if not isdir(path):
+            filepaths.append(path)
+            continue
+        for root, _, filenames in walk(path):
+            for filename in sorted(filenames):
+                if filename.lower().endswith(".a3d"):
+                    filepaths.append(join(root, filename))
+    return filepaths
+
+def configureWorker(level):
+    basicConfig(level=level, format="%(processName)s %(name)s: %(message)s")
+
+def processFile(filepath, useMmap=True, collectTimings=False, outputPath=None, outputVersion=None, validate=False):
+    # Runs in a worker process, never raises so one bad file can't take the batch down
+    result = {
+        "path": filepath,
+        "ok": False,
+        "error": None,
+        "seconds": 0.0,
+        "bytes": 0
+    }
+    start = perf_counter()
+    try:
+        result["bytes"] = getsize(filepath)
+        modelData = A3D()
+        modelData.collectTimings = collectTimings
+        if useMmap:
+            modelData.readMapped(filepath)
+        else:
+            with open(filepath, "rb") as file:
+                modelData.read(file)
+
+        result["version"] = modelData.version
+        result["materials"] = len(modelData.materials)
+        result["meshes"] = len(modelData.meshes)
+        result["transforms"] = len(modelData.transforms)
+        result["objects"] = len(modelData.objects)
+        result["vertices"] = sum(mesh.vertexCount for mesh in modelData.meshes)
+        result["triangles"] = sum(submesh.indexCount//3 for mesh in modelData.meshes for submesh in mesh.submeshes)
+        if collectTimings:
+            result["blockTimings"] = modelData.blockTimings
+        if validate:
+            result["problems"] = modelData.validate()
+            if len(result["problems"]) != 0:
+                raise RuntimeError(f"{len(result['problems'])} problems in the model data")
+
+        # Write the model back out, in another version if requested
+        if outputPath != None:
+            writeModel(modelData, outputPath, outputVersion)
+            result["output"] = outputPath
+        result["ok"] = True
+    except Exception as exception:
+        result["error"] = f"{type(exception).__name__}: {exception}"
+    result["seconds"] = perf_counter() - start
+
+    return result
+
+def writeModel(modelData, outputPath, outputVersion=None):
+    # The output may be the input file, whose memory mapping still backs the model data, so write a new file and swap it in
+    makedirs(dirname(outputPath), exist_ok=True)
+    handle, temporaryPath = mkstemp(dir=dirname(outputPath), suffix=".tmp")
+    try:
+        # mkstemp files are private, give the output the permissions a regular new file gets
+        currentUmask = umask(0)
+        umask(currentUmask)
+        chmod(temporaryPath, 0o666 & ~currentUmask)
+        with fdopen(handle, "wb") as file:
+            modelData.write(file, outputVersion)
+        replace(temporaryPath, outputPath)
+    except BaseException:
+        remove(temporaryPath)
+        raise
+
+def getOutputPaths(filepaths, outputDirectory):
+    # Mirror the input directory layout in the output directory
+    if outputDirectory == None or len(filepaths) == 0:
+        return [None] * len(filepaths)
+    if len(filepaths) == 1:
+        root = dirname(filepaths[0])
+    else:
+        root = commonpath([dirname(filepath) for filepath in filepaths])
+    return [join(outputDirectory, relpath(filepath, root)) for filepath in filepaths]
+
+def runFiles(function, filepaths, arguments=None, jobs=None, initializer=None, initargs=()):
+    '''
+    Call function(filepath, *arguments) for every file in a pool of worker
+    processes and return the results sorted by path. The function reports
+    failures in its result instead of raising, a worker that dies still gives
+    a failed result for its file
+    '''
+    if arguments == None:
+        arguments = [()] * len(filepaths)
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs, initializer=initializer, initargs=initargs) as executor:
+        futures = {executor.submit(function, filepath, *fileArguments): filepath for filepath, fileArguments in zip(filepaths, arguments)}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as exception:
+                # The worker itself died (e.g. killed or out of memory)
+                result = {"path": futures[future], "ok": False, "error": f"{type(exception).__name__}: {exception}", "problems": [], "seconds": 0.0, "bytes": 0}
+            results.append(result)
+    results.sort(key=lambda result: result["path"])
+
+    return results
+
+def writeReport(filepath, results, summary):
+    with open(filepath, "w") as file:
+        json.dump({"summary": summary, "files": results}, file, indent=4)
+
+def processFiles(filepaths, jobs=None, useMmap=True, collectTimings=False, logLevel=WARNING, outputDirectory=None, outputVersion=None, validate=False):
+    outputPaths = getOutputPaths(filepaths, outputDirectory)
+    arguments = [(useMmap, collectTimings, outputPath, outputVersion, validate) for outputPath in outputPaths]
+    return runFiles(processFile, filepaths, arguments, jobs, configureWorker, (logLevel,))
+
+def summarise(results, seconds):
+    succeeded = [result for result in results if result["ok"]]
+    failed = [result for result in results if not result["ok"]]
+    totalBytes = sum(result["bytes"] for result in results)
+
+    summary = {
+        "files": len(results),
+        "succeeded": len(succeeded),
+        "failed": len(failed),
+        "seconds": seconds,
+        "bytes": totalBytes,
+        "vertices": sum(result["vertices"] for result in succeeded),
+        "triangles": sum(result["triangles"] for result in succeeded),
+        "megabytesPerSecond": (totalBytes / (1024*1024)) / seconds if seconds > 0 else 0.0
+    }
+    return summary
+
+def printReport(results, summary, slowestCount=10):
+    print(f"Processed {summary['files']} files in {summary['seconds']:.2f}s ({summary['megabytesPerSecond']:.1f} MB/s)")
+    print(f"{summary['succeeded']} succeeded, {summary['failed']} failed, {summary['vertices']} vertices, {summary['triangles']} triangles")
+
+    slowest = sorted(results, key=lambda result: result["seconds"], reverse=True)[:slowestCount]
+    if len(slowest) != 0:
+        print("Slowest files:")
+        for result in slowest:
+            print(f"  {result['seconds']*1000:8.1f}ms {result['path']}")
+
+    failed = [result for result in results if not result["ok"]]
+    if len(failed) != 0:
+        print("Failed files:")
+        for result in failed:
+            print(f"  {result['path']}: {result['error']}")
+            for problem in result.get("problems", [])[:10]:
+                print(f"    {problem}")
+
+def main(argv=None):
+    parser = ArgumentParser(prog="python -m io_scene_a3d.A3DBatch", description="Parse, inspect and convert A3D files in bulk without blender")
+    parser.add_argument("paths", nargs="+", help="A3D files or directories to search for .a3d files")
+    parser.add_argument("-j", "--jobs", type=int, default=cpu_count(), help="Number of worker processes")
+    parser.add_argument("--no-mmap", action="store_true", help="Read files through a regular file object instead of a memory mapping")
+    parser.add_argument("--report", help="Write the per file results and summary to this JSON file")
+    parser.add_argument("--timings", action="store_true", help="Record the time spent reading each data block in the report")
+    parser.add_argument("--convert", metavar="DIRECTORY", help="Write every parsed file to this directory, keeping the input directory layout")
+    parser.add_argument("--version", type=int, choices=[2, 3], help="Version to convert to, by default files keep their own version")
+    parser.add_argument("--validate", action="store_true", help="Check the mesh data (index bounds, degenerate triangles, NaN coordinates) and object IDs, files with problems count as failed")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log details of every parsed object")
+    args = parser.parse_args(argv)
+
+    filepaths = findFiles(args.paths)
+    start = perf_counter()
+    results = processFiles(filepaths, args.jobs, not args.no_mmap, args.timings, DEBUG if args.verbose else WARNING, args.convert, args.version, args.validate)
+    summary = summarise(results, perf_counter() - start)
+
+    printReport(results, summary)
+    if args.report != None:
+        writeReport(args.report, results, summary)
+
+    return 0 if summary["failed"] == 0 else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
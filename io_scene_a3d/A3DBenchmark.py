@@ -0,0 +1,340 @@
+'''
+Copyright (c) 2024 Pyogenics <https://github.com/Pyogenics>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+from argparse import ArgumentParser
+from array import array
+from io import BufferedReader, BytesIO
+from os import remove
+from struct import pack
+from sys import byteorder
+from tempfile import NamedTemporaryFile
+from time import perf_counter
+import json
+import tracemalloc
+
+from .A3D import (
+    A3D,
+    A3D_SIGNATURE,
+    A3D_ROOTBLOCK_SIGNATURE,
+    A3D_MATERIALBLOCK_SIGNATURE,
+    A3D_MESHBLOCK_SIGNATURE,
+    A3D_TRANSFORMBLOCK_SIGNATURE,
+    A3D_OBJECTBLOCK_SIGNATURE
+)
+from .A3DObjects import (
+    A3DVertexBuffer,
+    A3DVertexSize,
+    A3D_VERTEXTYPE_COORDINATE,
+    A3D_VERTEXTYPE_UV1,
+    A3D_VERTEXTYPE_NORMAL1
+)
+from .IOTools import BufferStream, calculatePadding, readNullTerminatedString
+
+'''
+Parser benchmarks over synthetic A3D2/A3D3 files, no blender required:
+
+    python -m io_scene_a3d.A3DBenchmark [--save-baseline baseline.json] [--baseline baseline.json]
+'''
+
+'''
+Synthetic file generation
+'''
+class A3DSyntheticConfig:
+    def __init__(self, version=2, meshCount=1, vertexCount=1000, bufferTypes=(A3D_VERTEXTYPE_COORDINATE, A3D_VERTEXTYPE_UV1, A3D_VERTEXTYPE_NORMAL1), submeshCount=1, materialCount=1, objectCount=1, nameLength=8):
+        self.version = version
+        self.meshCount = meshCount
+        self.vertexCount = vertexCount # Per mesh, at most 65536 since indices are 16 bit
+        self.bufferTypes = bufferTypes
+        self.submeshCount = submeshCount # Per mesh
+        self.materialCount = materialCount
+        self.objectCount = objectCount # Also the transform count
+        self.nameLength = nameLength
+
+    def toDict(self):
+        return dict(self.__dict__, bufferTypes=list(self.bufferTypes))
+
+def packArray(typecode, values):
+    data = array(typecode, values)
+    if byteorder == "big":
+        data.byteswap()
+    return data.tobytes()
+
+def packName2(name):
+    return name.encode("utf8") + b"\x00"
+
+def packName3(name):
+    data = name.encode("utf8")
+    return pack("<I", len(data)) + data + bytes(calculatePadding(len(data)))
+
+def packBlock2(signature, count, content):
+    return pack("<3I", signature, len(content), count) + content
+
+def packBlock3(signature, count, content):
+    return pack("<3I", signature, len(content), count) + content + bytes(calculatePadding(len(content)))
+
+def makeName(prefix, index, length):
+    return f"{prefix}{index}".ljust(length, "_")
+
+def makeVertexData(bufferType, vertexCount):
+    size = A3DVertexSize[bufferType]
+    return packArray("f", (float(i % 1024) / 1024.0 for i in range(vertexCount * size)))
+
+def makeIndices(vertexCount, faceCount):
+    return packArray("H", (i % vertexCount for i in range(faceCount * 3)))
+
+def buildFile2(config):
+    materials = b"".join(packName2(makeName("material", i, config.nameLength)) + pack("<3f", 1.0, 1.0, 1.0) + packName2(makeName("diffuse", i, config.nameLength)) for i in range(config.materialCount))
+
+    meshes = b""
+    faceCount = config.vertexCount // config.submeshCount
+    for _ in range(config.meshCount):
+        meshes += pack("<2I", config.vertexCount, len(config.bufferTypes))
+        for bufferType in config.bufferTypes:
+            meshes += pack("<I", bufferType) + makeVertexData(bufferType, config.vertexCount)
+        meshes += pack("<I", config.submeshCount)
+        for submeshI in range(config.submeshCount):
+            meshes += pack("<I", faceCount) + makeIndices(config.vertexCount, faceCount)
+            meshes += packArray("I", (1 for _ in range(faceCount))) + pack("<H", submeshI % config.materialCount)
+
+    transforms = b"".join(pack("<3f4f3f", float(i), 0.0, 0.0, 0.0, 0.0, 0.0, 1.0, 1.0, 1.0, 1.0) for i in range(config.objectCount))
+    transforms += packArray("I", (0xFFFFFFFF for _ in range(config.objectCount)))
+
+    objects = b"".join(packName2(makeName("object", i, config.nameLength)) + pack("<2I", i % config.meshCount, i) for i in range(config.objectCount))
+
+    root = packBlock2(A3D_MATERIALBLOCK_SIGNATURE, config.materialCount, materials)
+    root += packBlock2(A3D_MESHBLOCK_SIGNATURE, config.meshCount, meshes)
+    root += packBlock2(A3D_TRANSFORMBLOCK_SIGNATURE, config.objectCount, transforms)
+    root += packBlock2(A3D_OBJECTBLOCK_SIGNATURE, config.objectCount, objects)
+    return A3D_SIGNATURE + pack("<2H", 2, 0) + pack("<2I", A3D_ROOTBLOCK_SIGNATURE, len(root)) + root
+
+def buildFile3(config):
+    materials = b"".join(packName3(makeName("material", i, config.nameLength)) + pack("<3f", 1.0, 1.0, 1.0) + packName3(makeName("diffuse", i, config.nameLength)) for i in range(config.materialCount))
+
+    meshes = b""
+    faceCount = config.vertexCount // config.submeshCount
+    for meshI in range(config.meshCount):
+        meshes += packName3(makeName("mesh", meshI, config.nameLength))
+        meshes += pack("<3f", 1.0, 1.0, 1.0) + pack("<3f", 0.0, 0.0, 0.0) + pack("<f", 0.0)
+        meshes += pack("<2I", config.vertexCount, len(config.bufferTypes))
+        for bufferType in config.bufferTypes:
+            meshes += pack("<I", bufferType) + makeVertexData(bufferType, config.vertexCount)
+        meshes += pack("<I", config.submeshCount)
+        for _ in range(config.submeshCount):
+            meshes += pack("<I", faceCount * 3) + makeIndices(config.vertexCount, faceCount) + bytes(calculatePadding(faceCount * 3 * 2))
+
+    transforms = b"".join(packName3(makeName("transform", i, config.nameLength)) + pack("<3f4f3f", float(i), 0.0, 0.0, 0.0, 0.0, 0.0, 1.0, 1.0, 1.0, 1.0) for i in range(config.objectCount))
+    transforms += packArray("I", (0xFFFFFFFF for _ in range(config.objectCount)))
+
+    objects = b"".join(pack("<3I", i % config.meshCount, i, 1) + pack("<i", i % config.materialCount) for i in range(config.objectCount))
+
+    root = packBlock3(A3D_MATERIALBLOCK_SIGNATURE, config.materialCount, materials)
+    root += packBlock3(A3D_MESHBLOCK_SIGNATURE, config.meshCount, meshes)
+    root += packBlock3(A3D_TRANSFORMBLOCK_SIGNATURE, config.objectCount, transforms)
+    root += packBlock3(A3D_OBJECTBLOCK_SIGNATURE, config.objectCount, objects)
+    return A3D_SIGNATURE + pack("<2H", 3, 0) + pack("<2I", A3D_ROOTBLOCK_SIGNATURE, len(root)) + root + bytes(calculatePadding(len(root)))
+
+def buildFile(config):
+    if config.version == 2:
+        return buildFile2(config)
+    return buildFile3(config)
+
+'''
+Benchmark cases
+'''
+A3D_BENCHMARK_CASES = {
+    "a3d2-bigmesh": A3DSyntheticConfig(version=2, meshCount=4, vertexCount=60000, submeshCount=2),
+    "a3d3-bigmesh": A3DSyntheticConfig(version=3, meshCount=4, vertexCount=60000, submeshCount=2),
+    "a3d2-scene": A3DSyntheticConfig(version=2, meshCount=200, vertexCount=300, submeshCount=1, materialCount=50, objectCount=5000, nameLength=32),
+    "a3d3-scene": A3DSyntheticConfig(version=3, meshCount=200, vertexCount=300, submeshCount=1, materialCount=50, objectCount=5000, nameLength=32)
+}
+A3D_BENCHMARK_MODES = ["stream", "mapped", "lazy"]
+
+def readModel(filepath, mode):
+    modelData = A3D()
+    if mode == "stream":
+        with open(filepath, "rb") as file:
+            modelData.read(file)
+    else:
+        modelData.readMapped(filepath, lazy=(mode == "lazy"))
+    return modelData
+
+def measure(function, repeats):
+    # Best wall time of all the repeats, and the peak python allocations of one extra traced run
+    best = None
+    for _ in range(repeats):
+        start = perf_counter()
+        function()
+        seconds = perf_counter() - start
+        if best == None or seconds < best:
+            best = seconds
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return best, peak
+
+def runFileCase(name, config, repeats):
+    data = buildFile(config)
+    with NamedTemporaryFile(suffix=".a3d", delete=False) as file:
+        file.write(data)
+        filepath = file.name
+
+    results = []
+    try:
+        vertexCount = config.meshCount * config.vertexCount
+        for mode in A3D_BENCHMARK_MODES:
+            seconds, peak = measure(lambda: readModel(filepath, mode), repeats)
+            results.append({
+                "name": f"{name}/{mode}",
+                "seconds": seconds,
+                "megabytesPerSecond": (len(data) / (1024*1024)) / seconds,
+                "verticesPerSecond": vertexCount / seconds,
+                "peakBytes": peak,
+                "bytes": len(data),
+                "config": config.toDict()
+            })
+    finally:
+        remove(filepath)
+
+    return results
+
+def runVertexBufferCase(vertexCount, repeats):
+    # A3DVertexBuffer.read2 on its own
+    data = pack("<I", A3D_VERTEXTYPE_COORDINATE) + makeVertexData(A3D_VERTEXTYPE_COORDINATE, vertexCount)
+
+    results = []
+    for mode, lazy in (("mapped", False), ("lazy", True)):
+        seconds, peak = measure(lambda: A3DVertexBuffer().read2(vertexCount, BufferStream(data), lazy), repeats)
+        results.append({
+            "name": f"vertexbuffer/{mode}",
+            "seconds": seconds,
+            "megabytesPerSecond": (len(data) / (1024*1024)) / seconds,
+            "verticesPerSecond": vertexCount / seconds,
+            "peakBytes": peak,
+            "bytes": len(data)
+        })
+
+    return results
+
+def readNullTerminatedStringBytewise(stream):
+    # The original byte at a time implementation, kept as the reference for the strings benchmark
+    string = b""
+    char = stream.read(1)
+    while char != b"\x00":
+        string += char
+        char = stream.read(1)
+    return string.decode("utf8", errors="ignore")
+
+def runStringCase(stringCount, nameLength, repeats):
+    # Null terminated A3D2 style names: "parser" is the BufferStream read every A3D.read/readMapped runs,
+    # "inspector-*" the chunked file object reads A3DInspect uses and "bytewise" the original reference
+    data = b"".join(packName2(makeName("object", i, nameLength)) for i in range(stringCount))
+
+    def readAll(reader, stream):
+        for _ in range(stringCount):
+            reader(stream)
+
+    results = []
+    for mode, reader, makeStream in (
+        ("bytewise", readNullTerminatedStringBytewise, lambda: BytesIO(data)),
+        ("inspector-stream", readNullTerminatedString, lambda: BytesIO(data)),
+        ("inspector-buffered", readNullTerminatedString, lambda: BufferedReader(BytesIO(data))),
+        ("parser", BufferStream.readNullTerminatedString, lambda: BufferStream(data))
+    ):
+        seconds, peak = measure(lambda: readAll(reader, makeStream()), repeats)
+        results.append({
+            "name": f"strings/{mode}",
+            "seconds": seconds,
+            "megabytesPerSecond": (len(data) / (1024*1024)) / seconds,
+            "verticesPerSecond": 0.0,
+            "stringsPerSecond": stringCount / seconds,
+            "peakBytes": peak,
+            "bytes": len(data)
+        })
+
+    return results
+
+def runBenchmarks(repeats=5, caseNames=None):
+    results = []
+    for name, config in A3D_BENCHMARK_CASES.items():
+        if caseNames != None and not (name in caseNames):
+            continue
+        results += runFileCase(name, config, repeats)
+    if caseNames == None or "vertexbuffer" in caseNames:
+        results += runVertexBufferCase(1000000, repeats)
+    if caseNames == None or "strings" in caseNames:
+        results += runStringCase(20000, 32, repeats)
+
+    return results
+
+'''
+Baselines
+'''
+def compareToBaseline(results, baseline, tolerance):
+    # Returns (name, baseline seconds, seconds) for every result that got slower than the tolerance allows
+    baselineTimes = {result["name"]: result["seconds"] for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        baselineSeconds = baselineTimes.get(result["name"])
+        if baselineSeconds == None:
+            continue
+        if result["seconds"] > baselineSeconds * (1.0 + tolerance):
+            regressions.append((result["name"], baselineSeconds, result["seconds"]))
+
+    return regressions
+
+def printResults(results):
+    print(f"{'benchmark':<28}{'time (ms)':>12}{'MB/s':>10}{'Mvert/s':>10}{'peak (MB)':>12}")
+    for result in results:
+        print(f"{result['name']:<28}{result['seconds']*1000:>12.2f}{result['megabytesPerSecond']:>10.1f}{result['verticesPerSecond']/1e6:>10.2f}{result['peakBytes']/(1024*1024):>12.2f}")
+
+def main(argv=None):
+    parser = ArgumentParser(prog="python -m io_scene_a3d.A3DBenchmark", description="Benchmark the A3D parser on synthetic files")
+    parser.add_argument("-r", "--repeats", type=int, default=5, help="Number of timed runs per benchmark, the best one is reported")
+    parser.add_argument("-c", "--case", action="append", dest="cases", help="Only run this case (can be repeated), one of: " + ", ".join(list(A3D_BENCHMARK_CASES.keys()) + ["vertexbuffer", "strings"]))
+    parser.add_argument("--save-baseline", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare the results against this JSON file and fail on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown against the baseline as a fraction")
+    args = parser.parse_args(argv)
+
+    results = runBenchmarks(args.repeats, args.cases)
+    printResults(results)
+
+    if args.save_baseline != None:
+        with open(args.save_baseline, "w") as file:
+            json.dump({"results": results}, file, indent=4)
+
+    if args.baseline != None:
+        with open(args.baseline, "r") as file:
+            baseline = json.load(file)
+        regressions = compareToBaseline(results, baseline, args.tolerance)
+        for name, baselineSeconds, seconds in regressions:
+            print(f"Regression in {name}: {baselineSeconds*1000:.2f}ms -> {seconds*1000:.2f}ms")
+        if len(regressions) != 0:
+            return 1
+
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
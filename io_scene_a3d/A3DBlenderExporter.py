@@ -0,0 +1,215 @@
+'''
+Copyright (c) 2024 Pyogenics <https://github.com/Pyogenics>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+from array import array
+from logging import getLogger
+import numpy as np
+
+from bpy_extras.node_shader_utils import PrincipledBSDFWrapper
+
+from .A3DObjects import (
+    A3DMaterial,
+    A3DMesh,
+    A3DVertexBuffer,
+    A3DSubmesh,
+    A3DTransform,
+    A3DObject,
+    A3DVertexSize,
+    A3D_VERTEXTYPE_COORDINATE,
+    A3D_VERTEXTYPE_UV1,
+    A3D_VERTEXTYPE_NORMAL1
+)
+
+logger = getLogger(__name__)
+
+A3D_MAX_VERTEXCOUNT = 65536 # Indices are 16 bit
+
+def toFloatArray(data):
+    result = array("f")
+    result.frombytes(np.ascontiguousarray(data, dtype=np.float32).tobytes())
+    return result
+
+def toUInt16Array(data):
+    result = array("H")
+    result.frombytes(np.ascontiguousarray(data, dtype=np.uint16).tobytes())
+    return result
+
+class A3DBlenderExporter:
+    def __init__(self, modelData, objects, depsgraph=None, apply_modifiers=True):
+        self.modelData = modelData
+        self.objects = [ob for ob in objects if ob.type == "MESH"]
+        self.depsgraph = depsgraph
+        self.materials = {} # Blender material -> material ID
+        self.meshes = {} # Mesh key -> (mesh ID, material slot index of each submesh)
+
+        # User settings
+        self.apply_modifiers = apply_modifiers
+
+    def exportData(self):
+        logger.info("Exporting %s blender objects", len(self.objects))
+
+        for ob in self.objects:
+            meshID, submeshSlots = self.getA3DMesh(ob)
+            transformID = self.buildA3DTransform(ob)
+
+            # Map the submeshes to materials through this object's material slots
+            objec = A3DObject()
+            objec.name = ob.name
+            objec.meshID = meshID
+            objec.transformID = transformID
+            materialIDs = []
+            for slotIndex in submeshSlots:
+                ma = None
+                if slotIndex < len(ob.material_slots):
+                    ma = ob.material_slots[slotIndex].material
+                materialIDs.append(-1 if ma == None else self.getA3DMaterial(ma))
+            objec.materialIDs = array("i", materialIDs)
+            objec.materialCount = len(materialIDs)
+            self.modelData.objects.append(objec)
+
+    '''
+    A3D data builders
+    '''
+    def getA3DMaterial(self, ma):
+        if ma in self.materials:
+            return self.materials[ma]
+
+        material = A3DMaterial()
+        material.name = ma.name
+        if ma.use_nodes:
+            maWrapper = PrincipledBSDFWrapper(ma, is_readonly=True)
+            material.color = tuple(maWrapper.base_color)
+        else:
+            material.color = tuple(ma.diffuse_color[:3])
+        self.modelData.materials.append(material)
+
+        materialID = len(self.modelData.materials) - 1
+        self.materials[ma] = materialID
+        return materialID
+
+    def getA3DMesh(self, ob):
+        # Objects share an A3D mesh whenever they share mesh data, unless modifiers make every object's geometry its own
+        useModifiers = self.apply_modifiers and self.depsgraph != None and len(ob.modifiers) != 0
+        key = ob if useModifiers else ob.data
+        if key in self.meshes:
+            return self.meshes[key]
+
+        if useModifiers:
+            obEval = ob.evaluated_get(self.depsgraph)
+            me = obEval.to_mesh()
+            try:
+                mesh, submeshSlots = self.buildA3DMesh(me, ob.data.name)
+            finally:
+                obEval.to_mesh_clear()
+        else:
+            mesh, submeshSlots = self.buildA3DMesh(ob.data, ob.data.name)
+        self.modelData.meshes.append(mesh)
+
+        self.meshes[key] = (len(self.modelData.meshes) - 1, submeshSlots)
+        return self.meshes[key]
+
+    def buildA3DMesh(self, me, name):
+        mesh = A3DMesh()
+        mesh.name = name
+
+        # Pull everything out of blender in bulk, one row per triangle corner
+        me.calc_loop_triangles()
+        triangleCount = len(me.loop_triangles)
+        corners = np.empty(triangleCount*3, dtype=np.int32)
+        me.loop_triangles.foreach_get("loops", corners)
+        triangleMaterials = np.empty(triangleCount, dtype=np.int32)
+        me.loop_triangles.foreach_get("material_index", triangleMaterials)
+
+        loopVertices = np.empty(len(me.loops), dtype=np.int32)
+        me.loops.foreach_get("vertex_index", loopVertices)
+        coordinates = np.empty(len(me.vertices)*3, dtype=np.float32)
+        me.vertices.foreach_get("co", coordinates)
+        normals = np.empty(len(me.loops)*3, dtype=np.float32)
+        me.corner_normals.foreach_get("vector", normals)
+
+        cornerData = [coordinates.reshape(-1, 3)[loopVertices[corners]], normals.reshape(-1, 3)[corners]]
+        bufferTypes = [A3D_VERTEXTYPE_COORDINATE, A3D_VERTEXTYPE_NORMAL1]
+        uvLayer = me.uv_layers.active
+        if uvLayer != None:
+            uvs = np.empty(len(me.loops)*2, dtype=np.float32)
+            uvLayer.data.foreach_get("uv", uvs)
+            uvs = uvs.reshape(-1, 2)[corners]
+            uvs[:, 1] = 1.0 - uvs[:, 1]
+            cornerData.append(uvs)
+            bufferTypes.append(A3D_VERTEXTYPE_UV1)
+        cornerData = np.ascontiguousarray(np.hstack(cornerData))
+
+        # Weld corners with identical position, normal and UV into one vertex by comparing the raw rows
+        rowType = np.dtype((np.void, cornerData.dtype.itemsize * cornerData.shape[1]))
+        _, firstCorners, cornerVertices = np.unique(cornerData.view(rowType).ravel(), return_index=True, return_inverse=True)
+        cornerVertices = cornerVertices.ravel()
+        vertexData = cornerData[firstCorners]
+        if len(vertexData) > A3D_MAX_VERTEXCOUNT:
+            raise RuntimeError(f"Mesh {name} has {len(vertexData)} vertices after welding, A3D meshes can have at most {A3D_MAX_VERTEXCOUNT}")
+
+        # Vertex buffers
+        mesh.vertexCount = len(vertexData)
+        column = 0
+        for bufferType in bufferTypes:
+            vertexSize = A3DVertexSize[bufferType]
+            vertexBuffer = A3DVertexBuffer()
+            vertexBuffer.bufferType = bufferType
+            vertexBuffer.vertexCount = mesh.vertexCount
+            vertexBuffer.vertexSize = vertexSize
+            vertexBuffer.data = toFloatArray(vertexData[:, column:column+vertexSize])
+            mesh.vertexBuffers.append(vertexBuffer)
+            column += vertexSize
+        mesh.vertexBufferCount = len(mesh.vertexBuffers)
+
+        if mesh.vertexCount != 0:
+            positions = vertexData[:, 0:3]
+            mesh.bboxMax = tuple(float(value) for value in positions.max(axis=0))
+            mesh.bboxMin = tuple(float(value) for value in positions.min(axis=0))
+        else:
+            mesh.bboxMax = (0.0, 0.0, 0.0)
+            mesh.bboxMin = (0.0, 0.0, 0.0)
+
+        # One submesh per material slot that is used
+        triangleVertices = cornerVertices.reshape(-1, 3)
+        submeshSlots = []
+        for slotIndex in np.unique(triangleMaterials):
+            submesh = A3DSubmesh()
+            submesh.indices = toUInt16Array(triangleVertices[triangleMaterials == slotIndex].ravel())
+            submesh.indexCount = len(submesh.indices)
+            mesh.submeshes.append(submesh)
+            submeshSlots.append(int(slotIndex))
+        mesh.submeshCount = len(mesh.submeshes)
+
+        logger.debug("Built A3D mesh %s with %s vertices from %s triangles", name, mesh.vertexCount, triangleCount)
+        return mesh, submeshSlots
+
+    def buildA3DTransform(self, ob):
+        transform = A3DTransform()
+        transform.name = ob.name
+        location, rotation, scale = ob.matrix_world.decompose()
+        transform.position = tuple(location)
+        w, x, y, z = rotation
+        transform.rotation = (x, y, z, w)
+        transform.scale = tuple(scale)
+        self.modelData.transforms.append(transform)
+
+        return len(self.modelData.transforms) - 1
@@ -20,10 +20,16 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 '''
 
+from logging import getLogger
+from time import perf_counter
+import numpy as np
+
 import bpy
 from bpy_extras.node_shader_utils import PrincipledBSDFWrapper
-from bpy_extras.image_utils import load_image
 
+from .A3DBlenderTextures import A3DTextureResolver
+from .A3DProfile import A3DImportReport
+from .A3DProxy import A3D_PROXY_RESOLUTION, buildBoundsProxy, buildClusterProxy
 from .A3DObjects import (
     A3D_VERTEXTYPE_COORDINATE,
     A3D_VERTEXTYPE_UV1,
@@ -33,6 +39,8 @@ from .A3DObjects import (
     A3D_VERTEXTYPE_NORMAL2
 )
 
+logger = getLogger(__name__)
+
 def addImageTextureToMaterial(image, node_tree):
     nodes = node_tree.nodes
     links = node_tree.links
@@ -48,39 +56,224 @@ def addImageTextureToMaterial(image, node_tree):
     # Apply image
     if image != None: textureNode.image = image
 
+# Datablocks built by earlier imports in this session, cache key -> (material names, mesh names)
+sessionCache = {}
+
 class A3DBlenderImporter:
-    def __init__(self, modelData, directory, create_collection=True, reset_empty_transform=True, try_import_textures=True):
+    def __init__(self, modelData, directory, create_collection=True, reset_empty_transform=True, try_import_textures=True, share_vertices=False, fast_validation=True, cacheKey=None, textureResolver=None, report=None, sourcePath=None, proxy_mode="NONE", proxy_resolution=A3D_PROXY_RESOLUTION):
         self.modelData = modelData
+        self.sourcePath = sourcePath # File the model was read from, objects are tagged with it so they can be reloaded later
+        self.report = A3DImportReport() if report == None else report # Filled in with the stage and mesh timings
         self.directory = directory
+        self.textureResolver = textureResolver # Shared between the files of a directory, created on demand otherwise
         self.materials = []
         self.meshes = []
+        self.meshMaterials = {} # Mesh ID -> materials in the mesh's own slots
+        self.cacheKey = cacheKey # Identifies the file contents and options, None disables datablock reuse
+        self.reusedDatablocks = False
 
         # User settings
         self.create_collection = create_collection
         self.reset_empty_transform = reset_empty_transform
         self.try_import_textures = try_import_textures
+        self.share_vertices = share_vertices
+        self.fast_validation = fast_validation
+        self.proxy_mode = proxy_mode # NONE, BOUNDS or CLUSTER, build stand-ins instead of the full meshes
+        self.proxy_resolution = proxy_resolution
 
     def importData(self):
-        print("Importing A3D model data into blender")
-        
-        # Create materials
-        for materialData in self.modelData.materials:
-            ma = self.buildBlenderMaterial(materialData)
-            self.materials.append(ma)
+        logger.info("Importing A3D model data into blender")
+        if self.try_import_textures and self.textureResolver == None:
+            self.textureResolver = A3DTextureResolver(self.directory)
+            self.textureResolver.prefetch()
         
-        # Build meshes
-        for meshData in self.modelData.meshes:
-            me = self.buildBlenderMesh(meshData)
-            self.meshes.append(me)
+        # Reuse the materials and meshes from an earlier import of the same file (linked duplicates)
+        self.reusedDatablocks = self.loadCachedDatablocks()
+        if not self.reusedDatablocks:
+            # Create materials
+            with self.report.stage("materials"):
+                for materialIndex, materialData in enumerate(self.modelData.materials):
+                    ma = self.buildBlenderMaterial(materialData)
+                    ma["a3d_material_index"] = materialIndex
+                    self.materials.append(ma)
+            
+            # Build meshes
+            with self.report.stage("meshes"):
+                for meshIndex, meshData in enumerate(self.modelData.meshes):
+                    me = self.buildBlenderMesh(meshData)
+                    me["a3d_mesh_index"] = meshIndex
+                    me["a3d_mesh_hash"] = self.getMeshHash(meshData)
+                    self.meshes.append(me)
+                self.storeCachedDatablocks()
         
         # Create objects
-        collection = bpy.context.collection # By default use the current active collection
-        if self.create_collection:
-            collection = bpy.data.collections.new("Object")
-            bpy.context.collection.children.link(collection)
-        for objectData in self.modelData.objects:
-            ob = self.buildBlenderObject(objectData)
-            collection.objects.link(ob)
+        with self.report.stage("objects"):
+            collection = bpy.context.collection # By default use the current active collection
+            if self.create_collection:
+                collection = bpy.data.collections.new("Object")
+                bpy.context.collection.children.link(collection)
+            objects = []
+            for objectIndex, objectData in enumerate(self.modelData.objects):
+                if objectData.meshID >= len(self.meshes) or objectData.transformID >= len(self.modelData.transforms):
+                    logger.warning("Skipping object %s, its mesh ID %s or transform ID %s is out of range", objectData.name, objectData.meshID, objectData.transformID)
+                    continue
+                ob = self.buildBlenderObject(objectData)
+                if self.sourcePath != None:
+                    ob["a3d_source"] = self.sourcePath
+                    ob["a3d_object_index"] = objectIndex
+                collection.objects.link(ob)
+                objects.append((ob, objectData))
+        with self.report.stage("hierarchy"):
+            self.buildHierarchy(objects, collection)
+
+    '''
+    Reloading
+    '''
+    def reloadData(self):
+        '''
+        Refresh the objects of an earlier import of the same file, only meshes
+        whose data changed are rebuilt and the objects keep their transforms
+        and modifiers. Returns False if nothing was imported from the file yet
+        '''
+        if self.sourcePath == None:
+            return False
+        existingObjects = [ob for ob in bpy.data.objects if ob.get("a3d_source") == self.sourcePath]
+        if len(existingObjects) == 0:
+            return False
+        logger.info("Reloading %s", self.sourcePath)
+
+        # Find the datablocks the earlier import made through its objects
+        meshObjects = {} # Mesh ID -> objects of this file using it
+        for ob in existingObjects:
+            me = ob.data
+            if me == None or not ("a3d_mesh_index" in me):
+                continue
+            meshObjects.setdefault(me["a3d_mesh_index"], []).append(ob)
+        with self.report.stage("materials"):
+            self.collectMaterials(existingObjects)
+
+        # Swap in new data for the meshes that changed, only this file's objects are pointed at it, other files may share the old mesh
+        rebuiltCount = 0
+        with self.report.stage("meshes"):
+            for meshIndex, objects in meshObjects.items():
+                if meshIndex >= len(self.modelData.meshes):
+                    continue
+                meshData = self.modelData.meshes[meshIndex]
+                meshHash = self.getMeshHash(meshData)
+                staleObjects = [ob for ob in objects if ob.data.get("a3d_mesh_hash") != meshHash]
+                if len(staleObjects) == 0:
+                    continue
+
+                newMe = self.buildBlenderMesh(meshData)
+                self.copyMaterialSlots(staleObjects[0].data, newMe)
+                newMe["a3d_mesh_index"] = meshIndex
+                newMe["a3d_mesh_hash"] = meshHash
+                for ob in staleObjects:
+                    me = ob.data
+                    ob.data = newMe
+                    if me.users == 0:
+                        name = me.name
+                        bpy.data.meshes.remove(me)
+                        newMe.name = name
+                rebuiltCount += 1
+        logger.info("Rebuilt %s of %s meshes", rebuiltCount, len(meshObjects))
+
+        objectIndices = set(ob.get("a3d_object_index") for ob in existingObjects)
+        missingCount = sum(1 for objectIndex in range(len(self.modelData.objects)) if not (objectIndex in objectIndices))
+        if missingCount != 0:
+            logger.warning("%s objects in %s are not in the scene, reloading only updates meshes, import the file again to get them", missingCount, self.sourcePath)
+        return True
+
+    def loadFullGeometry(self, objects):
+        '''
+        Swap the proxy meshes of the given objects (imported from this file)
+        for the full geometry, objects that were not passed in keep using the
+        proxies. Returns the number of meshes built
+        '''
+        with self.report.stage("materials"):
+            self.collectMaterials(objects)
+
+        fullMeshes = {}
+        with self.report.stage("meshes"):
+            for ob in objects:
+                me = ob.data
+                meshIndex = None if me == None else me.get("a3d_mesh_index")
+                if meshIndex == None or not me.get("a3d_proxy", False):
+                    continue
+                if meshIndex >= len(self.modelData.meshes):
+                    logger.warning("Skipping object %s, its mesh is not in %s anymore", ob.name, self.sourcePath)
+                    continue
+
+                # Objects sharing a proxy share the full mesh too
+                fullMe = fullMeshes.get(meshIndex)
+                if fullMe == None:
+                    meshData = self.modelData.meshes[meshIndex]
+                    fullMe = self.buildBlenderMesh(meshData)
+                    self.copyMaterialSlots(me, fullMe)
+                    fullMe["a3d_mesh_index"] = meshIndex
+                    fullMe["a3d_mesh_hash"] = self.getMeshHash(meshData)
+                    fullMeshes[meshIndex] = fullMe
+                ob.data = fullMe
+                if me.users == 0:
+                    bpy.data.meshes.remove(me)
+        logger.info("Loaded the full geometry of %s meshes", len(fullMeshes))
+        return len(fullMeshes)
+
+    def collectMaterials(self, objects):
+        # Reuse the materials an earlier import of the file gave these objects, build the rest
+        materials = {}
+        for ob in objects:
+            for slot in ob.material_slots:
+                if slot.material != None and "a3d_material_index" in slot.material:
+                    materials.setdefault(slot.material["a3d_material_index"], slot.material)
+        for materialIndex, materialData in enumerate(self.modelData.materials):
+            ma = materials.get(materialIndex)
+            if ma == None:
+                ma = self.buildBlenderMaterial(materialData)
+                ma["a3d_material_index"] = materialIndex
+            self.materials.append(ma)
+
+    def copyMaterialSlots(self, me, newMe):
+        # Version 3 materials live in the mesh slots the objects filled in, keep them
+        for slotIndex, ma in enumerate(me.materials[:len(newMe.materials)]):
+            if newMe.materials[slotIndex] == None:
+                newMe.materials[slotIndex] = ma
+
+    def getMeshHash(self, meshData):
+        # The same data builds different meshes depending on the vertex sharing and proxy options
+        meshHash = f"{meshData.calculateHash()}:{int(self.share_vertices)}"
+        if self.proxy_mode != "NONE":
+            meshHash += f":{self.proxy_mode}{self.proxy_resolution}"
+        return meshHash
+
+    '''
+    Datablock cache
+    '''
+    def loadCachedDatablocks(self):
+        if self.cacheKey == None or not (self.cacheKey in sessionCache):
+            return False
+
+        # The datablocks may have been deleted or renamed since, only reuse them if all of them are still there
+        materialNames, meshNames = sessionCache[self.cacheKey]
+        materials = [bpy.data.materials.get(name) for name in materialNames]
+        meshes = [bpy.data.meshes.get(name) for name in meshNames]
+        for datablock in materials + meshes:
+            if datablock == None or datablock.get("a3d_cache_key") != self.cacheKey:
+                del sessionCache[self.cacheKey]
+                return False
+
+        logger.info("Reusing datablocks from an earlier import")
+        self.materials = materials
+        self.meshes = meshes
+        return True
+
+    def storeCachedDatablocks(self):
+        if self.cacheKey == None:
+            return
+
+        for datablock in self.materials + self.meshes:
+            datablock["a3d_cache_key"] = self.cacheKey
+        sessionCache[self.cacheKey] = ([ma.name for ma in self.materials], [me.name for me in self.meshes])
 
     '''
     Blender data builders
@@ -94,108 +287,180 @@ class A3DBlenderImporter:
         return ma
 
     def buildBlenderMesh(self, meshData):
+        if self.proxy_mode != "NONE":
+            return self.buildProxyMesh(meshData)
+        start = perf_counter()
         me = bpy.data.meshes.new(meshData.name)
 
-        # Gather all vertex data
-        coordinates = []
-        uv1 = []
-        normal1 = []
-        uv2 = []
-        colors = []
-        normal2 = []
+        # Gather all vertex data, one row per A3D vertex
+        vertexData = {}
         for vertexBuffer in meshData.vertexBuffers:
-            if vertexBuffer.bufferType == A3D_VERTEXTYPE_COORDINATE:
-                coordinates += vertexBuffer.data
-            elif vertexBuffer.bufferType == A3D_VERTEXTYPE_UV1:
-                uv1 += vertexBuffer.data
-            elif vertexBuffer.bufferType == A3D_VERTEXTYPE_NORMAL1:
-                normal1 += vertexBuffer.data
-            elif vertexBuffer.bufferType == A3D_VERTEXTYPE_UV2:
-                uv2 += vertexBuffer.data
-            elif vertexBuffer.bufferType == A3D_VERTEXTYPE_COLOR:
-                colors += vertexBuffer.data
-            elif vertexBuffer.bufferType == A3D_VERTEXTYPE_NORMAL2:
-                normal2 += vertexBuffer.data
-
-        # Add blender vertices
-        blenderVertexIndices = []
-        blenderVertices = []
-        blenderUV1s = []
-        blenderUV2s = []
-        for submesh in meshData.submeshes:
-            polygonCount = len(submesh.indices) // 3
-            me.vertices.add(polygonCount*3)
-            me.loops.add(polygonCount*3)
-            me.polygons.add(polygonCount)
-
-            for indexI in range(submesh.indexCount):
-                index = submesh.indices[indexI]
-                blenderVertexIndices.append(indexI)
-                blenderVertices += list(coordinates[index])
-            if len(uv1) != 0:
-                for indexI in range(submesh.indexCount):
-                    index = submesh.indices[indexI]
-                    x, y = uv1[index]
-                    blenderUV1s.append((x, 1-y))
-            if len(uv2) != 0:
-                for indexI in range(submesh.indexCount):
-                    index = submesh.indices[indexI]
-                    x, y = uv2[index]
-                    blenderUV2s.append((x, 1-y))
-        me.vertices.foreach_set("co", blenderVertices)
-        me.polygons.foreach_set("loop_start", range(0, len(blenderVertices)//3, 3))
-        me.loops.foreach_set("vertex_index", blenderVertexIndices)
+            data = np.frombuffer(vertexBuffer.data, dtype=np.float32).reshape(-1, vertexBuffer.vertexSize)
+            vertexData.setdefault(vertexBuffer.bufferType, []).append(data)
+        vertexData = {bufferType: np.concatenate(buffers) for bufferType, buffers in vertexData.items()}
+        coordinates = vertexData.get(A3D_VERTEXTYPE_COORDINATE)
+        uv1 = vertexData.get(A3D_VERTEXTYPE_UV1)
+        uv2 = vertexData.get(A3D_VERTEXTYPE_UV2)
+        normal1 = vertexData.get(A3D_VERTEXTYPE_NORMAL1)
+        normal2 = vertexData.get(A3D_VERTEXTYPE_NORMAL2)
+        colors = vertexData.get(A3D_VERTEXTYPE_COLOR)
+        if coordinates is None or len(meshData.submeshes) == 0:
+            me.update()
+            self.report.addMesh(meshData.name, perf_counter() - start, 0, 0)
+            return me
+
+        indices = np.concatenate([np.asarray(submesh.indices[:submesh.indexCount//3*3], dtype=np.int32) for submesh in meshData.submeshes])
+        faceMaterials = np.repeat(np.arange(len(meshData.submeshes), dtype=np.int32), [submesh.indexCount//3 for submesh in meshData.submeshes])
+
+        # The parser's own checks decide whether blender's much slower generic validation is needed
+        problems = meshData.validate(len(self.materials))
+        validFaces = None
+        needsValidation = not self.fast_validation
+        if len(problems) != 0:
+            logger.warning("Mesh %s: %s", meshData.name, ", ".join(problems))
+            # Drop the triangles that point past the vertex data or repeat a vertex here, if blender's validation deleted them the loops would no longer line up with the normals
+            faces = indices.reshape(-1, 3)
+            validFaces = (faces < len(coordinates)).all(axis=1) & (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])
+            indices = faces[validFaces].ravel()
+            faceMaterials = faceMaterials[validFaces]
+            # Blender's validation is only needed for what is left, non finite coordinates
+            needsValidation = needsValidation or not np.isfinite(coordinates).all()
+        cornerCount = len(indices)
+        if self.share_vertices:
+            # One blender vertex per A3D vertex, the index buffers become the loop vertex indices
+            me.vertices.add(len(coordinates))
+            me.vertices.foreach_set("co", coordinates.ravel())
+            loopVertexIndices = indices
+        else:
+            # Every triangle corner gets its own blender vertex, gather them all with one lookup over the index buffers
+            me.vertices.add(cornerCount)
+            me.vertices.foreach_set("co", coordinates[indices].ravel())
+            loopVertexIndices = np.arange(cornerCount, dtype=np.int32)
+        me.loops.add(cornerCount)
+        me.polygons.add(cornerCount//3)
+        me.loops.foreach_set("vertex_index", loopVertexIndices)
+        me.polygons.foreach_set("loop_start", np.arange(0, cornerCount, 3, dtype=np.int32))
 
         # UVs
-        if len(uv1) != 0:
-            uvData = me.uv_layers.new(name="UV1").data
-            for polygonI, po in enumerate(me.polygons):
-                indexI = polygonI * 3
-                uvData[po.loop_start].uv = blenderUV1s[blenderVertexIndices[indexI]]
-                uvData[po.loop_start+1].uv = blenderUV1s[blenderVertexIndices[indexI+1]]
-                uvData[po.loop_start+2].uv = blenderUV1s[blenderVertexIndices[indexI+2]]
-        if len(uv2) != 0:
-            uvData = me.uv_layers.new(name="UV2").data
-            for polygonI, po in enumerate(me.polygons):
-                indexI = polygonI * 3
-                uvData[po.loop_start].uv = blenderUV2s[blenderVertexIndices[indexI]]
-                uvData[po.loop_start+1].uv = blenderUV2s[blenderVertexIndices[indexI+1]]
-                uvData[po.loop_start+2].uv = blenderUV2s[blenderVertexIndices[indexI+2]]
-
-        # Apply materials (version 2)
-        faceIndexBase = 0
-        for submeshI, submesh in enumerate(meshData.submeshes):
-            if submesh.materialID == None:
+        for name, uvs in (("UV1", uv1), ("UV2", uv2)):
+            if uvs is None:
                 continue
-            me.materials.append(self.materials[submesh.materialID])
-            for faceI in range(submesh.indexCount//3):
-                me.polygons[faceI+faceIndexBase].material_index = submeshI
-            faceIndexBase += submesh.indexCount//3
+            blenderUVs = uvs[indices]
+            blenderUVs[:, 1] = 1.0 - blenderUVs[:, 1]
+            me.uv_layers.new(name=name).data.foreach_set("uv", blenderUVs.ravel())
+
+        # Vertex colours and the secondary normals, stored on the corners like the UVs
+        if colors is not None:
+            me.color_attributes.new("Color", "FLOAT_COLOR", "CORNER").data.foreach_set("color", colors[indices].ravel())
+        if normal2 is not None:
+            me.attributes.new("Normal2", "FLOAT_VECTOR", "CORNER").data.foreach_set("vector", normal2[indices].ravel())
+
+        self.addMaterialSlots(me, meshData)
+        me.polygons.foreach_set("material_index", faceMaterials)
+
+        # Smoothing groups (version 2), only shared vertices give triangles edges in common
+        me.update(calc_edges=True)
+        if self.share_vertices:
+            self.applySmoothingGroups(me, meshData, validFaces)
 
         # Finalise
-        me.validate()
+        finaliseStart = perf_counter()
+        if needsValidation:
+            me.validate(clean_customdata=False)
+        if normal1 is not None:
+            if len(me.loops) == cornerCount:
+                # Custom normals only show up on smooth faces
+                me.shade_smooth()
+                me.normals_split_custom_set(normal1[indices])
+            else:
+                logger.warning("Mesh %s: blender's validation removed faces, the normals were not imported", meshData.name)
         me.update()
+        end = perf_counter()
+        self.report.addMesh(meshData.name, end - start, len(coordinates), cornerCount//3, end - finaliseStart)
+        return me
+
+    def buildProxyMesh(self, meshData):
+        # Stand-in geometry with shared vertices and no UVs, normals or colours, "Load Full A3D Geometry" swaps in the real mesh later
+        start = perf_counter()
+        me = bpy.data.meshes.new(meshData.name)
+        if self.proxy_mode == "BOUNDS":
+            coordinates, faces, faceMaterials = buildBoundsProxy(meshData)
+        else:
+            coordinates, faces, faceMaterials = buildClusterProxy(meshData, self.proxy_resolution)
+        cornerCount = faces.size
+        me.vertices.add(len(coordinates))
+        me.vertices.foreach_set("co", coordinates.ravel())
+        me.loops.add(cornerCount)
+        me.polygons.add(len(faces))
+        me.loops.foreach_set("vertex_index", faces.ravel())
+        me.polygons.foreach_set("loop_start", np.arange(0, cornerCount, 3, dtype=np.int32))
+        self.addMaterialSlots(me, meshData)
+        me.polygons.foreach_set("material_index", faceMaterials)
+        me.update(calc_edges=True)
+        me["a3d_proxy"] = True
+        self.report.addMesh(meshData.name, perf_counter() - start, len(coordinates), len(faces))
         return me
 
+    def addMaterialSlots(self, me, meshData):
+        # One material slot per submesh, version 2 submeshes name their material and version 3 objects fill the slots in later
+        for submesh in meshData.submeshes:
+            if submesh.materialID == None or submesh.materialID >= len(self.materials):
+                me.materials.append(None)
+            else:
+                me.materials.append(self.materials[submesh.materialID])
+
+    def applySmoothingGroups(self, me, meshData, validFaces=None):
+        for submesh in meshData.submeshes:
+            if submesh.smoothingGroupCount != submesh.indexCount//3:
+                return
+        faceGroups = np.concatenate([np.asarray(submesh.smoothingGroups, dtype=np.uint32) for submesh in meshData.submeshes])
+        if validFaces is not None:
+            faceGroups = faceGroups[validFaces] # Same faces as the ones that were built
+        if not faceGroups.any():
+            return
+
+        # An edge is smooth only if every face around it shares at least one smoothing group, AND the groups of the faces on each edge together
+        loopEdges = np.empty(len(me.loops), dtype=np.int32)
+        me.loops.foreach_get("edge_index", loopEdges)
+        edgeCount = len(me.edges)
+        edgeGroups = np.full(edgeCount, 0xFFFFFFFF, dtype=np.uint32)
+        np.bitwise_and.at(edgeGroups, loopEdges, np.repeat(faceGroups, 3))
+        edgeFaceCounts = np.bincount(loopEdges, minlength=edgeCount)
+        sharpEdges = (edgeGroups == 0) & (edgeFaceCounts > 1)
+
+        me.attributes.new("sharp_edge", "BOOLEAN", "EDGE").data.foreach_set("value", sharpEdges)
+
+    def applyObjectMaterials(self, ob, objectData):
+        # Version 3 materials belong to the objects, version 2 meshes already have theirs
+        if len(objectData.materialIDs) == 0:
+            return
+        me = ob.data
+        materials = []
+        for slotIndex in range(len(me.materials)):
+            materialID = objectData.materialIDs[slotIndex] if slotIndex < len(objectData.materialIDs) else -1
+            materials.append(None if materialID == -1 or materialID >= len(self.materials) else self.materials[materialID])
+        materials = tuple(materials)
+
+        # The first object using a mesh decides the mesh's own materials (reused meshes already have them)
+        if not (objectData.meshID in self.meshMaterials):
+            if not self.reusedDatablocks:
+                for slotIndex, ma in enumerate(materials):
+                    me.materials[slotIndex] = ma
+            self.meshMaterials[objectData.meshID] = tuple(me.materials)
+
+        # Objects with other materials keep them in object linked slots instead of changing the shared mesh
+        if materials != self.meshMaterials[objectData.meshID]:
+            for slot, ma in zip(ob.material_slots, materials):
+                slot.link = "OBJECT"
+                slot.material = ma
+
     def buildBlenderObject(self, objectData):
-        print("Building object name=", objectData.name, ", meshId=", objectData.meshID, ", transformId=", objectData.transformID)
-        print("Available transforms count:", len(self.modelData.transforms))
+        logger.debug("Building object name=%s, meshID=%s, transformID=%s", objectData.name, objectData.meshID, objectData.transformID)
 
         me = self.meshes[objectData.meshID]
         mesh = self.modelData.meshes[objectData.meshID]
         transform = self.modelData.transforms[objectData.transformID]
 
-        parentId = self.modelData.parentIds[objectData.meshID] #TODO
-
-        # Apply materials to mesh (version 3)
-        for materialID in objectData.materialIDs:
-            if materialID == -1:
-                continue
-            me.materials.append(self.materials[materialID])
-        # Set the default material to the first one we added
-        for polygon in me.polygons:
-            polygon.material_index = 0
-
         # Select a name for the blender object
         #XXX: review this, maybe we should just stick to the name we are given
         name = ""
@@ -206,46 +471,84 @@ class A3DBlenderImporter:
         else:
             name = transform.name
 
-        # Create the object
+        # Create the object, every object using a mesh shares its datablock
         ob = bpy.data.objects.new(name, me)
+        self.applyObjectMaterials(ob, objectData)
 
-        # Set transform
-        ob.location = transform.position
-        ob.scale = transform.scale
-        ob.rotation_mode = "QUATERNION"
-        x, y, z, w = transform.rotation
-        ob.rotation_quaternion = (w, x, y, z)
-        if self.reset_empty_transform:
-            if transform.scale == (0.0, 0.0, 0.0): ob.scale = (1.0, 1.0, 1.0)
-            if transform.rotation == (0.0, 0.0, 0.0, 0.0): ob.rotation_quaternion = (1.0, 0.0, 0.0, 0.0)
+        self.applyTransform(ob, transform)
 
         # Attempt to load textures
-        if self.try_import_textures and len(me.materials) != 0:
-            ma = me.materials[0] # Assume this is the main material
+        if self.try_import_textures and len(ob.material_slots) != 0 and ob.material_slots[0].material != None:
+            ma = ob.material_slots[0].material # Assume this is the main material
             name = name.lower()
             if name == "hull" or name == "turret":
                 # lightmap.webp
-                print("Load lightmap")
+                logger.debug("Load lightmap")
                 
                 # Load image
-                image = load_image("lightmap.webp", self.directory, check_existing=True)
+                image = self.textureResolver.getImage("lightmap.webp")
                 # Apply image
                 addImageTextureToMaterial(image, ma.node_tree)
             elif "track" in name:
                 # tracks.webp
-                print("Load tracks")
+                logger.debug("Load tracks")
 
                 # Load image
-                image = load_image("tracks.webp", self.directory, check_existing=True)
+                image = self.textureResolver.getImage("tracks.webp")
                 # Apply image
                 addImageTextureToMaterial(image, ma.node_tree)
             elif "wheel" in name:
                 # wheels.webp
-                print("Load wheels")
+                logger.debug("Load wheels")
 
                 # Load image
-                image = load_image("wheels.webp", self.directory, check_existing=True)
+                image = self.textureResolver.getImage("wheels.webp")
                 # Apply image
                 addImageTextureToMaterial(image, ma.node_tree)
 
-        return ob
\ No newline at end of file
+        return ob
+
+    def applyTransform(self, ob, transform):
+        # Transforms are relative to the parent transform
+        ob.location = transform.position
+        ob.scale = transform.scale
+        ob.rotation_mode = "QUATERNION"
+        x, y, z, w = transform.rotation
+        ob.rotation_quaternion = (w, x, y, z)
+        if self.reset_empty_transform:
+            if transform.scale == (0.0, 0.0, 0.0): ob.scale = (1.0, 1.0, 1.0)
+            if transform.rotation == (0.0, 0.0, 0.0, 0.0): ob.rotation_quaternion = (1.0, 0.0, 0.0, 0.0)
+
+    def buildHierarchy(self, objects, collection):
+        parents, order = self.modelData.resolveTransformHierarchy()
+        transformCount = len(parents)
+
+        # Objects placed by each transform
+        placements = [(ob, objectData.transformID) for ob, objectData in objects]
+        transformObjects = [None] * transformCount
+        for ob, transformID in reversed(placements):
+            transformObjects[transformID] = ob
+
+        # Transforms without an object still need an empty if something below them has one
+        needed = bytearray(transformCount)
+        for ob, transformID in placements:
+            needed[transformID] = 1
+        for transformID in reversed(order):
+            parentID = parents[transformID]
+            if needed[transformID] and parentID != -1:
+                needed[parentID] = 1
+        for transformID in order:
+            if not needed[transformID] or transformObjects[transformID] != None:
+                continue
+            transform = self.modelData.transforms[transformID]
+            ob = bpy.data.objects.new(transform.name, None)
+            self.applyTransform(ob, transform)
+            collection.objects.link(ob)
+            transformObjects[transformID] = ob
+            placements.append((ob, transformID))
+
+        # Transforms are local to their parent so parenting is all blender needs to work out the world matrices
+        for ob, transformID in placements:
+            parentID = parents[transformID]
+            if parentID != -1:
+                ob.parent = transformObjects[parentID]
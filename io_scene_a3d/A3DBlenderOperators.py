@@ -0,0 +1,343 @@
+'''
+Copyright (c) 2024 Pyogenics <https://github.com/Pyogenics>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from logging import getLogger, Formatter, StreamHandler, DEBUG, INFO, WARNING
+from os.path import dirname, getsize, join
+from time import perf_counter
+import cProfile
+import tracemalloc
+
+import bpy
+from bpy.types import Operator, OperatorFileListElement
+from bpy.props import StringProperty, BoolProperty, EnumProperty, IntProperty, CollectionProperty
+from bpy_extras.io_utils import ImportHelper, ExportHelper
+
+from .A3D import A3D
+from .A3DBatch import findFiles
+from .A3DBlenderImporter import A3DBlenderImporter
+from .A3DBlenderExporter import A3DBlenderExporter
+from .A3DBlenderTextures import A3DTextureResolver
+from .A3DCache import A3DDiskCache, hashFile
+from .A3DProfile import A3DImportReport, dumpReports
+from .A3DProxy import A3D_PROXY_RESOLUTION
+
+logger = getLogger(__name__)
+
+A3D_IMPORT_MAXTHREADS = 4
+
+'''
+Operators
+'''
+class ImportA3D(Operator, ImportHelper):
+    bl_idname = "import_scene.alternativa"
+    bl_label = "Import A3D"
+    bl_description = "Import an A3D model"
+    bl_options = {'PRESET', 'UNDO'}
+
+    filter_glob: StringProperty(default="*.a3d", options={'HIDDEN'})
+    directory: StringProperty(subtype='DIR_PATH', options={'HIDDEN'})
+    files: CollectionProperty(type=OperatorFileListElement, options={'HIDDEN', 'SKIP_SAVE'})
+
+    # User options
+    import_directory: BoolProperty(name="Import whole directory", description="Import every .a3d file in the directory (and its subdirectories) instead of only the selected files", default=False)
+    reload_existing: BoolProperty(name="Reload existing", description="Update the objects of files that were imported before instead of importing them again, only meshes whose data changed are rebuilt and objects keep their transforms and modifiers", default=False)
+    create_collection: BoolProperty(name="Create collection", description="Create a collection to hold all the model objects", default=True)
+    try_import_textures: BoolProperty(name="Search for textures", description="Automatically search for lightmap, track and wheel textures and attempt to apply them", default=True)
+    reset_empty_transform: BoolProperty(name="Reset empty transforms", description="Reset rotation and scale if it is set to 0, more useful for version 2 models like props", default=True)
+    share_vertices: BoolProperty(name="Share vertices", description="Create one vertex per model vertex instead of one per triangle corner, gives connected geometry with a fraction of the vertices", default=False)
+    proxy_mode: EnumProperty(name="Proxies", description="Import lightweight stand-ins instead of the full meshes to keep big maps interactive, the full geometry of selected objects can be loaded later from Object > Load Full A3D Geometry", items=[("NONE", "None", "Import the full meshes"), ("BOUNDS", "Bound boxes", "Replace every mesh with its bound box"), ("CLUSTER", "Decimated", "Simplify every mesh by merging the vertices in each cell of a grid")], default="NONE")
+    proxy_resolution: IntProperty(name="Proxy resolution", description="Grid cells along the longest side of each mesh for decimated proxies, higher keeps more detail", default=A3D_PROXY_RESOLUTION, min=1, max=256)
+    fast_validation: BoolProperty(name="Fast validation", description="Only run blender's mesh validation on meshes that fail the importer's own checks (index bounds, degenerate triangles, NaN coordinates, material IDs), much faster on big models", default=True)
+    use_cache: BoolProperty(name="Use cache", description="Reuse meshes and materials from earlier imports of the same file", default=True)
+    use_disk_cache: BoolProperty(name="Use disk cache", description="Keep parsed files in an on disk cache, only faster than parsing for files read without a memory mapping", default=False)
+    use_mmap: BoolProperty(name="Memory map file", description="Parse the file from a memory mapping instead of reading it piece by piece, faster and uses less memory on big files", default=True)
+    print_timings: BoolProperty(name="Print timings", description="Print how long each import stage and the slowest meshes of each file took to the console", default=False)
+    profile_allocations: BoolProperty(name="Profile allocations", description="Record the peak python memory use of the whole process while each import stage runs, files still being parsed in the background count towards it. Makes the import a lot slower", default=False)
+    profile_directory: StringProperty(name="Profile output", description="Write a JSON timing report and a cProfile dump of the main thread to this directory", subtype='DIR_PATH', default="")
+    verbose_logging: BoolProperty(name="Verbose logging", description="Print details of every parsed object to the console, slows down big imports", default=False)
+
+    def draw(self, context):
+        import_panel_options(self.layout, self)
+
+    def invoke(self, context, event):
+        return ImportHelper.invoke(self, context, event)
+
+    def execute(self, context):
+        filepaths = self.getFilepaths()
+        if len(filepaths) == 0:
+            self.report({"WARNING"}, "No A3D files selected")
+            return {"CANCELLED"}
+        configureLogging(self.verbose_logging, self.print_timings)
+        # Blender hands back paths relative to the .blend file as //path
+        profileDirectory = bpy.path.abspath(self.profile_directory) if self.profile_directory != "" else ""
+        profiling = self.print_timings or profileDirectory != ""
+        cacheDirectory = None
+        if self.use_disk_cache:
+            cacheDirectory = bpy.utils.extension_path_user(__package__, path="cache", create=True)
+
+        # List each directory's textures once and start reading them in the background before any geometry is built
+        textureResolvers = {}
+        if self.try_import_textures:
+            for directory in sorted(set(dirname(filepath) for filepath in filepaths)):
+                textureResolvers[directory] = A3DTextureResolver(directory)
+                textureResolvers[directory].prefetch()
+
+        # Parse the files in worker threads while the main thread builds blender data from the ones that are done
+        failedCount = 0
+        reports = {filepath: A3DImportReport(filepath) for filepath in filepaths}
+        profiler = None
+        if profileDirectory != "":
+            profiler = cProfile.Profile()
+            profiler.enable()
+        if self.profile_allocations:
+            tracemalloc.start()
+        try:
+            with ThreadPoolExecutor(max_workers=min(len(filepaths), A3D_IMPORT_MAXTHREADS)) as executor:
+                futures = {executor.submit(readModelData, filepath, self.use_mmap, self.use_cache, cacheDirectory, self.share_vertices, profiling, reports[filepath], self.proxy_mode, self.proxy_resolution): filepath for filepath in filepaths}
+                for future in as_completed(futures):
+                    filepath = futures[future]
+                    try:
+                        modelData, cacheKey = future.result()
+                    except Exception as exception:
+                        self.report({"WARNING"}, f"Failed to read {filepath}: {exception}")
+                        failedCount += 1
+                        del reports[filepath]
+                        continue
+
+                    # Import data into blender
+                    directory = dirname(filepath)
+                    modelImporter = A3DBlenderImporter(modelData, directory, self.create_collection, self.reset_empty_transform, self.try_import_textures, self.share_vertices, self.fast_validation, cacheKey, textureResolvers.get(directory), reports[filepath], filepath, self.proxy_mode, self.proxy_resolution)
+                    if not (self.reload_existing and modelImporter.reloadData()):
+                        modelImporter.importData()
+                    if self.print_timings:
+                        logger.info("%s", reports[filepath].format())
+        finally:
+            if self.profile_allocations:
+                tracemalloc.stop()
+            if profiler != None:
+                profiler.disable()
+        if profiler != None:
+            profiler.dump_stats(join(profileDirectory, "a3d_import.prof"))
+            dumpReports(list(reports.values()), join(profileDirectory, "a3d_import.json"))
+
+        if failedCount == len(filepaths):
+            return {"CANCELLED"}
+        return {"FINISHED"}
+
+    def getFilepaths(self):
+        if self.import_directory:
+            return findFiles([self.directory])
+
+        filepaths = [join(self.directory, file.name) for file in self.files if file.name != ""]
+        if len(filepaths) == 0 and self.filepath != "":
+            filepaths.append(self.filepath)
+        return filepaths
+
+class ExportA3D(Operator, ExportHelper):
+    bl_idname = "export_scene.alternativa"
+    bl_label = "Export A3D"
+    bl_description = "Export an A3D model"
+    bl_options = {'PRESET'}
+
+    filename_ext = ".a3d"
+    filter_glob: StringProperty(default="*.a3d", options={'HIDDEN'})
+
+    # User options
+    use_selection: BoolProperty(name="Selected only", description="Only export the selected objects instead of every mesh in the scene", default=False)
+    apply_modifiers: BoolProperty(name="Apply modifiers", description="Export the meshes with their modifiers applied", default=True)
+    version: EnumProperty(name="Version", description="A3D version to write", items=[("3", "A3D3", "Version 3 model"), ("2", "A3D2", "Version 2 model")], default="3")
+    verbose_logging: BoolProperty(name="Verbose logging", description="Print details of every exported object to the console", default=False)
+
+    def draw(self, context):
+        export_panel_options(self.layout, self)
+
+    def execute(self, context):
+        configureLogging(self.verbose_logging, False)
+        objects = context.selected_objects if self.use_selection else context.scene.objects
+
+        start = perf_counter()
+        modelData = A3D()
+        modelExporter = A3DBlenderExporter(modelData, objects, context.evaluated_depsgraph_get(), self.apply_modifiers)
+        try:
+            modelExporter.exportData()
+        except RuntimeError as exception:
+            self.report({"ERROR"}, str(exception))
+            return {"CANCELLED"}
+        if len(modelData.objects) == 0:
+            self.report({"WARNING"}, "No mesh objects to export")
+            return {"CANCELLED"}
+
+        with open(self.filepath, "wb") as file:
+            modelData.write(file, int(self.version))
+        logger.info("Exported %s in %.2fms", self.filepath, (perf_counter() - start) * 1000)
+
+        return {"FINISHED"}
+
+class LoadFullGeometryA3D(Operator):
+    bl_idname = "object.alternativa_load_full_geometry"
+    bl_label = "Load Full A3D Geometry"
+    bl_description = "Replace the proxy meshes of the selected objects with the full geometry from their A3D files"
+    bl_options = {"REGISTER", "UNDO"}
+
+    share_vertices: BoolProperty(name="Share vertices", description="Create one vertex per model vertex instead of one per triangle corner, gives connected geometry with a fraction of the vertices", default=False)
+    fast_validation: BoolProperty(name="Fast validation", description="Only run blender's mesh validation on meshes that fail the importer's own checks", default=True)
+
+    @classmethod
+    def poll(cls, context):
+        return any(isProxyObject(ob) for ob in context.selected_objects)
+
+    def execute(self, context):
+        # Read every source file once
+        sources = {}
+        for ob in context.selected_objects:
+            if isProxyObject(ob):
+                sources.setdefault(ob["a3d_source"], []).append(ob)
+
+        meshCount = 0
+        for filepath, objects in sources.items():
+            try:
+                modelData, _ = readModelData(filepath)
+            except Exception as exception:
+                self.report({"WARNING"}, f"Failed to read {filepath}: {exception}")
+                continue
+            modelImporter = A3DBlenderImporter(modelData, dirname(filepath), share_vertices=self.share_vertices, fast_validation=self.fast_validation, sourcePath=filepath)
+            meshCount += modelImporter.loadFullGeometry(objects)
+        self.report({"INFO"}, f"Loaded the full geometry of {meshCount} meshes")
+
+        return {"FINISHED"}
+
+def isProxyObject(ob):
+    return ob.type == "MESH" and ob.get("a3d_source") != None and ob.data.get("a3d_proxy", False)
+
+def configureLogging(verbose, timings):
+    packageLogger = getLogger(__package__)
+    level = WARNING
+    if verbose:
+        level = DEBUG
+    elif timings:
+        level = INFO
+    packageLogger.setLevel(level)
+
+    # Blender doesn't configure logging, make sure the messages reach the console
+    if level < WARNING and len(packageLogger.handlers) == 0:
+        handler = StreamHandler()
+        handler.setFormatter(Formatter("%(name)s: %(message)s"))
+        packageLogger.addHandler(handler)
+
+def readModelData(filepath, useMmap=True, useCache=False, cacheDirectory=None, share_vertices=False, collectTimings=False, report=None, proxy_mode="NONE", proxy_resolution=A3D_PROXY_RESOLUTION):
+    # Runs in a worker thread, must not touch bpy
+    start = perf_counter()
+    modelData = None
+    cacheKey = None
+    if useCache or cacheDirectory != None:
+        fileHash = hashFile(filepath)
+    if useCache:
+        cacheKey = f"{fileHash}:{int(share_vertices)}"
+        if proxy_mode != "NONE":
+            cacheKey += f":{proxy_mode}{proxy_resolution}"
+    if cacheDirectory != None:
+        diskCache = A3DDiskCache(cacheDirectory)
+        modelData = diskCache.get(fileHash)
+    if modelData == None:
+        logger.info("Reading A3D data from %s", filepath)
+        modelData = A3D()
+        modelData.collectTimings = collectTimings
+        if useMmap:
+            modelData.readMapped(filepath)
+        else:
+            with open(filepath, "rb") as file:
+                modelData.read(file)
+        if cacheDirectory != None:
+            diskCache.put(fileHash, modelData)
+
+    if report != None:
+        report.bytes = getsize(filepath)
+        report.addStage("read", perf_counter() - start)
+        report.addBlockTimings(modelData.blockTimings)
+    return modelData, cacheKey
+
+'''
+Menu
+'''
+def import_panel_options(layout, operator):
+    header, body = layout.panel("alternativa_import_options", default_closed=False)
+    header.label(text="Options")
+    if body:
+        body.prop(operator, "import_directory")
+        body.prop(operator, "reload_existing")
+        body.prop(operator, "create_collection")
+        body.prop(operator, "try_import_textures")
+        body.prop(operator, "reset_empty_transform")
+        body.prop(operator, "share_vertices")
+        body.prop(operator, "proxy_mode")
+        if operator.proxy_mode == "CLUSTER":
+            body.prop(operator, "proxy_resolution")
+        body.prop(operator, "fast_validation")
+        body.prop(operator, "use_cache")
+        body.prop(operator, "use_disk_cache")
+        body.prop(operator, "use_mmap")
+        body.prop(operator, "print_timings")
+        body.prop(operator, "profile_allocations")
+        body.prop(operator, "profile_directory")
+        body.prop(operator, "verbose_logging")
+
+def export_panel_options(layout, operator):
+    header, body = layout.panel("alternativa_export_options", default_closed=False)
+    header.label(text="Options")
+    if body:
+        body.prop(operator, "use_selection")
+        body.prop(operator, "apply_modifiers")
+        body.prop(operator, "version")
+        body.prop(operator, "verbose_logging")
+
+def menu_func_import_a3d(self, context):
+    self.layout.operator(ImportA3D.bl_idname, text="Alternativa3D HTML5 (.a3d)")
+
+def menu_func_export_a3d(self, context):
+    self.layout.operator(ExportA3D.bl_idname, text="Alternativa3D HTML5 (.a3d)")
+
+def menu_func_load_full_geometry(self, context):
+    self.layout.operator(LoadFullGeometryA3D.bl_idname)
+
+'''
+Registration
+'''
+classes = [
+    ImportA3D,
+    ExportA3D,
+    LoadFullGeometryA3D
+]
+
+def register():
+    for c in classes:
+        bpy.utils.register_class(c)
+    bpy.types.TOPBAR_MT_file_import.append(menu_func_import_a3d)
+    bpy.types.TOPBAR_MT_file_export.append(menu_func_export_a3d)
+    bpy.types.VIEW3D_MT_object.append(menu_func_load_full_geometry)
+
+def unregister():
+    for c in classes:
+        bpy.utils.unregister_class(c)
+    bpy.types.TOPBAR_MT_file_import.remove(menu_func_import_a3d)
+    bpy.types.TOPBAR_MT_file_export.remove(menu_func_export_a3d)
+    bpy.types.VIEW3D_MT_object.remove(menu_func_load_full_geometry)
@@ -0,0 +1,92 @@
+'''
+Copyright (c) 2024 Pyogenics <https://github.com/Pyogenics>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+from logging import getLogger
+from os import scandir
+
+import bpy
+
+logger = getLogger(__name__)
+
+A3D_TEXTURE_NAMES = ("lightmap.webp", "tracks.webp", "wheels.webp")
+A3D_TEXTURE_READSIZE = 1024*1024
+
+# Images loaded by earlier imports in this session, file path -> image name
+sessionImages = {}
+
+def readAhead(filepath):
+    # Pull the file into the OS cache, the data itself is thrown away
+    with open(filepath, "rb") as file:
+        while len(file.read(A3D_TEXTURE_READSIZE)) != 0:
+            pass
+
+class A3DTextureResolver:
+    '''
+    Finds textures next to the models, the directory is listed once and every
+    image is only loaded once per session
+    '''
+    def __init__(self, directory):
+        self.directory = directory
+        self.files = {} # Lower case file name -> path
+        try:
+            with scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        self.files[entry.name.lower()] = entry.path
+        except OSError as exception:
+            logger.warning("Could not list textures in %s: %s", directory, exception)
+
+    def prefetch(self, filenames=A3D_TEXTURE_NAMES):
+        # bpy can only be used from the main thread, so the background thread just reads the files ahead of time while the geometry is built
+        filepaths = [self.files[filename] for filename in filenames if filename in self.files]
+        filepaths = [filepath for filepath in filepaths if self.getCachedImage(filepath) == None]
+        if len(filepaths) == 0:
+            return
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        for filepath in filepaths:
+            executor.submit(readAhead, filepath)
+        executor.shutdown(wait=False)
+
+    def getCachedImage(self, filepath):
+        if not (filepath in sessionImages):
+            return None
+
+        # The image may have been removed or pointed somewhere else since
+        image = bpy.data.images.get(sessionImages[filepath])
+        if image == None or image.filepath != filepath:
+            del sessionImages[filepath]
+            return None
+        return image
+
+    def getImage(self, filename):
+        filepath = self.files.get(filename.lower())
+        if filepath == None:
+            return None
+
+        image = self.getCachedImage(filepath)
+        if image == None:
+            logger.debug("Load %s", filepath)
+            image = bpy.data.images.load(filepath, check_existing=True)
+            sessionImages[filepath] = image.name
+        return image
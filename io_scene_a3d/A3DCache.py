@@ -0,0 +1,118 @@
+'''
+Copyright (c) 2024 Pyogenics <https://github.com/Pyogenics>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+from hashlib import blake2b
+from logging import getLogger
+from os import fdopen, listdir, makedirs, remove, replace, stat, utime
+from os.path import join
+from tempfile import mkstemp
+import pickle
+
+logger = getLogger(__name__)
+
+'''
+Cache constants
+'''
+A3D_CACHE_VERSION = 3 # Bump whenever the layout of the parsed objects changes
+A3D_CACHE_MAXSIZE = 256 * 1024 * 1024
+A3D_CACHE_EXTENSION = ".a3dcache"
+
+def hashFile(filepath):
+    fileHash = blake2b(digest_size=16)
+    with open(filepath, "rb") as file:
+        for chunk in iter(lambda: file.read(1024*1024), b""):
+            fileHash.update(chunk)
+    return fileHash.hexdigest()
+
+'''
+Size bounded on disk cache of parsed A3D files, keyed by file content hash
+'''
+class A3DDiskCache:
+    def __init__(self, directory, maxSize=A3D_CACHE_MAXSIZE):
+        self.directory = directory
+        self.maxSize = maxSize
+        makedirs(directory, exist_ok=True)
+
+    def getPath(self, fileHash):
+        return join(self.directory, f"{fileHash}-{A3D_CACHE_VERSION}{A3D_CACHE_EXTENSION}")
+
+    def get(self, fileHash):
+        path = self.getPath(fileHash)
+        try:
+            with open(path, "rb") as file:
+                modelData = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except Exception as exception:
+            # Corrupt or incompatible entry, drop it and parse the file again
+            logger.warning("Discarding unreadable cache entry %s: %s", path, exception)
+            self.remove(path)
+            return None
+
+        # Mark as recently used
+        utime(path)
+        return modelData
+
+    def put(self, fileHash, modelData):
+        # Best effort, a failed cache write must never fail the import
+        path = self.getPath(fileHash)
+        temporaryPath = None
+        try:
+            # Unique temporary file, imports of files with the same contents write the same entry at the same time
+            handle, temporaryPath = mkstemp(dir=self.directory, suffix=".tmp")
+            with fdopen(handle, "wb") as file:
+                pickle.dump(modelData, file, protocol=pickle.HIGHEST_PROTOCOL)
+            replace(temporaryPath, path)
+            temporaryPath = None
+            self.evict()
+        except Exception as exception:
+            logger.warning("Failed to write cache entry %s: %s", path, exception)
+        finally:
+            if temporaryPath != None:
+                self.remove(temporaryPath)
+
+    def evict(self):
+        # Remove least recently used entries until the cache fits in maxSize
+        entries = []
+        for filename in listdir(self.directory):
+            if not filename.endswith(A3D_CACHE_EXTENSION):
+                continue
+            path = join(self.directory, filename)
+            try:
+                info = stat(path)
+            except OSError:
+                continue # Removed by another import in the meantime
+            entries.append((info.st_mtime, info.st_size, path))
+        entries.sort()
+
+        totalSize = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if totalSize <= self.maxSize:
+                break
+            self.remove(path)
+            totalSize -= size
+
+    def remove(self, path):
+        try:
+            remove(path)
+        except OSError:
+            pass
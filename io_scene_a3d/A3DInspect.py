@@ -0,0 +1,329 @@
+'''
+Copyright (c) 2024 Pyogenics <https://github.com/Pyogenics>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+from argparse import ArgumentParser
+from os import cpu_count, SEEK_CUR
+from os.path import getsize
+from time import perf_counter
+
+from .IOTools import unpackArray, readNullTerminatedString, calculatePadding, UINT16, UINT16x2, UINT32, UINT32x2, UINT32x3
+from .A3D import (
+    A3D_SIGNATURE,
+    A3D_ROOTBLOCK_SIGNATURE,
+    A3D_MATERIALBLOCK_SIGNATURE,
+    A3D_MESHBLOCK_SIGNATURE,
+    A3D_TRANSFORMBLOCK_SIGNATURE,
+    A3D_OBJECTBLOCK_SIGNATURE,
+    A3D_NOPARENT
+)
+from .A3DObjects import A3DVertexSize, A3D_TRANSFORM_SIZE
+from .A3DBatch import findFiles, runFiles, writeReport
+
+'''
+Streaming validation of A3D files, no blender required:
+
+    python -m io_scene_a3d.A3DInspect <files or directories> [--jobs N] [--report report.json]
+
+Only headers are read, vertex and index payloads are seeked past using their
+known sizes so memory use does not depend on the size of the file.
+'''
+
+A3D_INSPECT_CHUNKSIZE = 4096 # IDs checked per read
+A3D_INSPECT_MAXPROBLEMS = 20 # Problems kept per file, the rest are only counted
+
+class A3DInspector:
+    def __init__(self, stream, fileSize):
+        self.stream = stream
+        self.fileSize = fileSize
+        self.version = None
+
+        # Counts from the blocks read so far, used to check the IDs in later blocks
+        self.materialCount = 0
+        self.meshCount = 0
+        self.transformCount = 0
+        self.objectCount = 0
+        self.vertexBufferCount = 0
+        self.submeshCount = 0
+        self.vertexCount = 0
+        self.triangleCount = 0
+        self.payloadBytes = 0 # Bytes seeked past instead of read
+
+        # Problems that don't stop the file from being walked
+        self.problems = []
+        self.problemCount = 0
+
+    '''
+    Stream helpers
+    '''
+    def read(self, size):
+        data = self.stream.read(size)
+        if len(data) != size:
+            raise RuntimeError(f"Unexpected end of file at offset {self.stream.tell()}, {size - len(data)} bytes missing")
+        return data
+
+    def unpack(self, structure):
+        return structure.unpack(self.read(structure.size))
+
+    def skip(self, size):
+        position = self.stream.tell()
+        if position + size > self.fileSize:
+            raise RuntimeError(f"Unexpected end of file at offset {self.fileSize}, payload at {position} needs {size} bytes")
+        self.stream.seek(size, SEEK_CUR)
+
+    def skipPayload(self, size):
+        self.skip(size)
+        self.payloadBytes += size
+
+    def skipLengthPrefixedString(self):
+        length, = self.unpack(UINT32)
+        self.skip(length + calculatePadding(length))
+
+    def problem(self, message):
+        self.problemCount += 1
+        if len(self.problems) < A3D_INSPECT_MAXPROBLEMS:
+            self.problems.append(f"offset {self.stream.tell()}: {message}")
+
+    def checkIDs(self, typecode, count, limit, name, allowed=()):
+        # Check a run of IDs a chunk at a time so huge blocks don't need huge buffers
+        while count > 0:
+            chunkSize = min(count, A3D_INSPECT_CHUNKSIZE)
+            ids = unpackArray(typecode, chunkSize, self.stream)
+            if len(ids) != chunkSize:
+                raise RuntimeError(f"Unexpected end of file at offset {self.stream.tell()} while reading {name}s")
+            for id in ids:
+                if id >= limit and not (id in allowed):
+                    self.problem(f"{name} {id} out of range (count {limit})")
+            count -= chunkSize
+
+    def checkID(self, id, limit, name, allowed=()):
+        if id >= limit and not (id in allowed):
+            self.problem(f"{name} {id} out of range (count {limit})")
+
+    def readBlockHeader(self, expectedSignature, name):
+        signature, length, count = self.unpack(UINT32x3)
+        if signature != expectedSignature:
+            raise RuntimeError(f"Invalid {name} data block signature: {signature}")
+        return length, count
+
+    def checkBlockLength(self, start, length, name):
+        # Only version 3 block lengths are reliable enough to check
+        if self.version != 3:
+            return
+        actualLength = self.stream.tell() - start
+        if actualLength != length:
+            self.problem(f"{name} data block length is {length} but its contents are {actualLength} bytes")
+        self.skip(calculatePadding(length))
+
+    '''
+    Main IO
+    '''
+    def inspect(self):
+        signature = self.read(4)
+        if signature != A3D_SIGNATURE:
+            raise RuntimeError(f"Invalid A3D signature: {signature}")
+        self.version, _ = self.unpack(UINT16x2)
+        if not (self.version in (2, 3)):
+            raise RuntimeError(f"Unsupported A3D version {self.version}")
+
+        rootSignature, rootLength = self.unpack(UINT32x2)
+        if rootSignature != A3D_ROOTBLOCK_SIGNATURE:
+            raise RuntimeError(f"Invalid root data block signature: {rootSignature}")
+        rootStart = self.stream.tell()
+
+        self.inspectMaterialBlock()
+        self.inspectMeshBlock()
+        self.inspectTransformBlock()
+        self.inspectObjectBlock()
+
+        if self.version == 3:
+            self.checkBlockLength(rootStart, rootLength, "root")
+        trailingBytes = self.fileSize - self.stream.tell()
+        if trailingBytes != 0:
+            self.problem(f"{trailingBytes} trailing bytes after the root data block")
+
+    '''
+    Data blocks
+    '''
+    def inspectMaterialBlock(self):
+        length, self.materialCount = self.readBlockHeader(A3D_MATERIALBLOCK_SIGNATURE, "material")
+        start = self.stream.tell()
+        for _ in range(self.materialCount):
+            if self.version == 2:
+                readNullTerminatedString(self.stream)
+                self.skip(12) # Colour
+                readNullTerminatedString(self.stream)
+            else:
+                self.skipLengthPrefixedString()
+                self.skip(12)
+                self.skipLengthPrefixedString()
+        self.checkBlockLength(start, length, "material")
+
+    def inspectMeshBlock(self):
+        length, self.meshCount = self.readBlockHeader(A3D_MESHBLOCK_SIGNATURE, "mesh")
+        start = self.stream.tell()
+        for _ in range(self.meshCount):
+            if self.version == 3:
+                self.skipLengthPrefixedString()
+                self.skip(28) # Bound box and unknown float
+
+            # Vertex buffers
+            vertexCount, vertexBufferCount = self.unpack(UINT32x2)
+            self.vertexCount += vertexCount
+            self.vertexBufferCount += vertexBufferCount
+            for _ in range(vertexBufferCount):
+                bufferType, = self.unpack(UINT32)
+                if not (bufferType in A3DVertexSize):
+                    raise RuntimeError(f"Unknown vertex buffer type: {bufferType}")
+                self.skipPayload(vertexCount * A3DVertexSize[bufferType] * 4)
+
+            # Submeshes
+            submeshCount, = self.unpack(UINT32)
+            self.submeshCount += submeshCount
+            for _ in range(submeshCount):
+                if self.version == 2:
+                    faceCount, = self.unpack(UINT32)
+                    self.skipPayload(faceCount*3*2 + faceCount*4) # Indices and smoothing groups
+                    materialID, = self.unpack(UINT16)
+                    self.checkID(materialID, self.materialCount, "submesh materialID", (0xFFFF,))
+                else:
+                    indexCount, = self.unpack(UINT32)
+                    if indexCount % 3 != 0:
+                        self.problem(f"submesh index count {indexCount} is not a multiple of 3")
+                    faceCount = indexCount // 3
+                    self.skipPayload(indexCount*2)
+                    self.skip(calculatePadding(indexCount*2))
+                self.triangleCount += faceCount
+        self.checkBlockLength(start, length, "mesh")
+
+    def inspectTransformBlock(self):
+        length, self.transformCount = self.readBlockHeader(A3D_TRANSFORMBLOCK_SIGNATURE, "transform")
+        start = self.stream.tell()
+        if self.version == 2:
+            self.skip(self.transformCount * A3D_TRANSFORM_SIZE*4)
+        else:
+            for _ in range(self.transformCount):
+                self.skipLengthPrefixedString()
+                self.skip(A3D_TRANSFORM_SIZE*4)
+        self.checkIDs("I", self.transformCount, self.transformCount, "parentID", (A3D_NOPARENT,))
+        self.checkBlockLength(start, length, "transform")
+
+    def inspectObjectBlock(self):
+        length, self.objectCount = self.readBlockHeader(A3D_OBJECTBLOCK_SIGNATURE, "object")
+        start = self.stream.tell()
+        for _ in range(self.objectCount):
+            if self.version == 2:
+                readNullTerminatedString(self.stream)
+                meshID, transformID = self.unpack(UINT32x2)
+            else:
+                meshID, transformID, materialCount = self.unpack(UINT32x3)
+                self.checkIDs("i", materialCount, self.materialCount, "object materialID", (-1,))
+            self.checkID(meshID, self.meshCount, "object meshID")
+            self.checkID(transformID, self.transformCount, "object transformID")
+        self.checkBlockLength(start, length, "object")
+
+def inspectFile(filepath):
+    # Runs in a runFiles worker, corrupt files end up in the result
+    result = {
+        "path": filepath,
+        "ok": False,
+        "error": None,
+        "problems": [],
+        "seconds": 0.0,
+        "bytes": 0
+    }
+    start = perf_counter()
+    inspector = None
+    try:
+        result["bytes"] = getsize(filepath)
+        with open(filepath, "rb") as file:
+            inspector = A3DInspector(file, result["bytes"])
+            inspector.inspect()
+    except Exception as exception:
+        result["error"] = f"{type(exception).__name__}: {exception}"
+    result["seconds"] = perf_counter() - start
+
+    if inspector != None:
+        result["version"] = inspector.version
+        result["materials"] = inspector.materialCount
+        result["meshes"] = inspector.meshCount
+        result["transforms"] = inspector.transformCount
+        result["objects"] = inspector.objectCount
+        result["vertices"] = inspector.vertexCount
+        result["triangles"] = inspector.triangleCount
+        result["payloadBytes"] = inspector.payloadBytes
+        result["problems"] = inspector.problems
+        result["problemCount"] = inspector.problemCount
+    result["ok"] = result["error"] == None and len(result["problems"]) == 0
+
+    return result
+
+def summarise(results, seconds):
+    totalBytes = sum(result["bytes"] for result in results)
+    summary = {
+        "files": len(results),
+        "valid": sum(1 for result in results if result["ok"]),
+        "invalid": sum(1 for result in results if not result["ok"]),
+        "seconds": seconds,
+        "bytes": totalBytes,
+        "payloadBytes": sum(result.get("payloadBytes", 0) for result in results),
+        "vertices": sum(result.get("vertices", 0) for result in results),
+        "triangles": sum(result.get("triangles", 0) for result in results),
+        "megabytesPerSecond": (totalBytes / (1024*1024)) / seconds if seconds > 0 else 0.0
+    }
+    return summary
+
+def printReport(results, summary):
+    print(f"Inspected {summary['files']} files in {summary['seconds']:.2f}s ({summary['megabytesPerSecond']:.1f} MB/s)")
+    print(f"{summary['valid']} valid, {summary['invalid']} invalid, {summary['vertices']} vertices, {summary['triangles']} triangles")
+
+    for result in results:
+        if result["ok"]:
+            continue
+        print(f"{result['path']}:")
+        if result["error"] != None:
+            print(f"  {result['error']}")
+        for problem in result["problems"]:
+            print(f"  {problem}")
+        hiddenCount = result.get("problemCount", 0) - len(result["problems"])
+        if hiddenCount > 0:
+            print(f"  ... and {hiddenCount} more problems")
+
+def main(argv=None):
+    parser = ArgumentParser(prog="python -m io_scene_a3d.A3DInspect", description="Validate A3D files without loading their geometry")
+    parser.add_argument("paths", nargs="+", help="A3D files or directories to search for .a3d files")
+    parser.add_argument("-j", "--jobs", type=int, default=cpu_count(), help="Number of worker processes")
+    parser.add_argument("--report", help="Write the per file results and summary to this JSON file")
+    args = parser.parse_args(argv)
+
+    filepaths = findFiles(args.paths)
+    start = perf_counter()
+    results = runFiles(inspectFile, filepaths, jobs=args.jobs)
+    summary = summarise(results, perf_counter() - start)
+
+    printReport(results, summary)
+    if args.report != None:
+        writeReport(args.report, results, summary)
+
+    return 0 if summary["invalid"] == 0 else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -20,33 +20,78 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 '''
 
-from .IOTools import unpackStream, readNullTerminatedString, readLengthPrefixedString, calculatePadding
+from array import array
+from hashlib import blake2b
+from logging import getLogger
+from math import isfinite
+from operator import eq
+
+from .IOTools import (
+    unpackArrayAt,
+    toArray,
+    calculatePadding,
+    calculateNullTerminatedStringSize,
+    calculateLengthPrefixedStringSize,
+    writeNullTerminatedString,
+    writeLengthPrefixedString,
+    writeArray,
+    UINT16,
+    UINT32,
+    UINT32x2,
+    UINT32x3,
+    FLOAT32,
+    FLOAT32x3,
+    TRANSFORM
+)
+
+logger = getLogger(__name__)
 
 class A3DMaterial:
+    __slots__ = ("name", "color", "diffuseMap")
+
     def __init__(self):
         self.name = ""
         self.color = (0.0, 0.0, 0.0)
         self.diffuseMap = ""
     
     def read2(self, stream):
-        self.name = readNullTerminatedString(stream)
-        self.color = unpackStream("<3f", stream)
-        self.diffuseMap = readNullTerminatedString(stream)
+        self.name = stream.readNullTerminatedString()
+        self.color = stream.unpack(FLOAT32x3)
+        self.diffuseMap = stream.readNullTerminatedString()
 
-        print(f"[A3DMaterial name: {self.name} color: {self.color} diffuse map: {self.diffuseMap}]")
+        logger.debug("[A3DMaterial name: %s color: %s diffuse map: %s]", self.name, self.color, self.diffuseMap)
 
     def read3(self, stream):
-        self.name = readLengthPrefixedString(stream)
-        self.color = unpackStream("<3f", stream)
-        self.diffuseMap = readLengthPrefixedString(stream)
+        self.name = stream.readLengthPrefixedString()
+        self.color = stream.unpack(FLOAT32x3)
+        self.diffuseMap = stream.readLengthPrefixedString()
+
+        logger.debug("[A3DMaterial name: %s color: %s diffuse map: %s]", self.name, self.color, self.diffuseMap)
+
+    def write2(self, stream):
+        writeNullTerminatedString(self.name, stream)
+        stream.write(FLOAT32x3.pack(*self.color))
+        writeNullTerminatedString(self.diffuseMap, stream)
+
+    def write3(self, stream):
+        writeLengthPrefixedString(self.name, stream)
+        stream.write(FLOAT32x3.pack(*self.color))
+        writeLengthPrefixedString(self.diffuseMap, stream)
 
-        print(f"[A3DMaterial name: {self.name} color: {self.color} diffuse map: {self.diffuseMap}]")
+    def calculateSize2(self):
+        return calculateNullTerminatedStringSize(self.name) + FLOAT32x3.size + calculateNullTerminatedStringSize(self.diffuseMap)
+
+    def calculateSize3(self):
+        return calculateLengthPrefixedStringSize(self.name) + FLOAT32x3.size + calculateLengthPrefixedStringSize(self.diffuseMap)
 
 class A3DMesh:
+    __slots__ = ("name", "bboxMax", "bboxMin", "unknown", "vertexBuffers", "submeshes", "vertexCount", "vertexBufferCount", "submeshCount", "offset", "size")
+
     def __init__(self):
         self.name = ""
         self.bboxMax = None
         self.bboxMin = None
+        self.unknown = 0.0 # Only kept so files can be written back unchanged
         self.vertexBuffers = []
         self.submeshes = []
 
@@ -54,47 +99,135 @@ class A3DMesh:
         self.vertexBufferCount = 0
         self.submeshCount = 0
 
-    def read2(self, stream):
+        # Location of the mesh in the file
+        self.offset = 0
+        self.size = 0
+
+    def read2(self, stream, lazy=False):
+        self.offset = stream.tell()
+
         # Read vertex buffers
-        self.vertexCount, self.vertexBufferCount = unpackStream("<2I", stream)
-        print("unpacking vertex buffers, count=", self.vertexBufferCount)
+        self.vertexCount, self.vertexBufferCount = stream.unpack(UINT32x2)
         for _ in range(self.vertexBufferCount):
             vertexBuffer = A3DVertexBuffer()
-            vertexBuffer.read2(self.vertexCount, stream)
+            vertexBuffer.read2(self.vertexCount, stream, lazy)
             self.vertexBuffers.append(vertexBuffer)
         
         # Read submeshes
-        self.submeshCount, = unpackStream("<I", stream)
+        self.submeshCount, = stream.unpack(UINT32)
         for _ in range(self.submeshCount):
             submesh = A3DSubmesh()
-            submesh.read2(stream)
+            submesh.read2(stream, lazy)
             self.submeshes.append(submesh)
         
-        print(f"[A3DMesh name: {self.name} bbox max: {self.bboxMax} bbox min: {self.bboxMin} vertex buffers: {len(self.vertexBuffers)} submeshes: {len(self.submeshes)}]")
+        self.size = stream.tell() - self.offset
+        logger.debug("[A3DMesh name: %s bbox max: %s bbox min: %s vertex buffers: %s submeshes: %s]", self.name, self.bboxMax, self.bboxMin, len(self.vertexBuffers), len(self.submeshes))
     
-    def read3(self, stream):
+    def read3(self, stream, lazy=False):
+        self.offset = stream.tell()
+
         # Read mesh info
-        self.name = readLengthPrefixedString(stream)
+        self.name = stream.readLengthPrefixedString()
         # XXX: bbox order maybe incorrect, check this (might be min then max and not max then min)
-        self.bboxMax = unpackStream("<3f", stream)
-        self.bboxMin = unpackStream("<3f", stream)
-        stream.read(4) # XXX: Unknown float value
+        self.bboxMax = stream.unpack(FLOAT32x3)
+        self.bboxMin = stream.unpack(FLOAT32x3)
+        self.unknown, = stream.unpack(FLOAT32) # XXX: Unknown float value
 
         # Read vertex buffers
-        self.vertexCount, self.vertexBufferCount = unpackStream("<2I", stream)
+        self.vertexCount, self.vertexBufferCount = stream.unpack(UINT32x2)
         for _ in range(self.vertexBufferCount):
             vertexBuffer = A3DVertexBuffer()
-            vertexBuffer.read2(self.vertexCount, stream)
+            vertexBuffer.read2(self.vertexCount, stream, lazy)
             self.vertexBuffers.append(vertexBuffer)
         
         # Read submeshes
-        self.submeshCount, = unpackStream("<I", stream)
+        self.submeshCount, = stream.unpack(UINT32)
         for _ in range(self.submeshCount):
             submesh = A3DSubmesh()
-            submesh.read3(stream)
+            submesh.read3(stream, lazy)
             self.submeshes.append(submesh)
         
-        print(f"[A3DMesh name: {self.name} bbox max: {self.bboxMax} bbox min: {self.bboxMin} vertex buffers: {len(self.vertexBuffers)} submeshes: {len(self.submeshes)}]")
+        self.size = stream.tell() - self.offset
+        logger.debug("[A3DMesh name: %s bbox max: %s bbox min: %s vertex buffers: %s submeshes: %s]", self.name, self.bboxMax, self.bboxMin, len(self.vertexBuffers), len(self.submeshes))
+
+    def write2(self, stream, materialIDs=None):
+        # Write vertex buffers
+        stream.write(UINT32x2.pack(self.vertexCount, len(self.vertexBuffers)))
+        for vertexBuffer in self.vertexBuffers:
+            vertexBuffer.write2(stream)
+
+        # Write submeshes, materialIDs overrides the submesh material IDs
+        stream.write(UINT32.pack(len(self.submeshes)))
+        for submeshIndex, submesh in enumerate(self.submeshes):
+            submesh.write2(stream, None if materialIDs == None else materialIDs[submeshIndex])
+
+    def write3(self, stream):
+        # Write mesh info
+        writeLengthPrefixedString(self.name, stream)
+        bboxMax, bboxMin = self.bboxMax, self.bboxMin
+        if bboxMax == None or bboxMin == None:
+            bboxMax, bboxMin = self.calculateBoundBox()
+        stream.write(FLOAT32x3.pack(*bboxMax))
+        stream.write(FLOAT32x3.pack(*bboxMin))
+        stream.write(FLOAT32.pack(self.unknown))
+
+        # Write vertex buffers
+        stream.write(UINT32x2.pack(self.vertexCount, len(self.vertexBuffers)))
+        for vertexBuffer in self.vertexBuffers:
+            vertexBuffer.write2(stream)
+
+        # Write submeshes
+        stream.write(UINT32.pack(len(self.submeshes)))
+        for submesh in self.submeshes:
+            submesh.write3(stream)
+
+    def calculateSize2(self):
+        size = UINT32x2.size + UINT32.size
+        size += sum(vertexBuffer.calculateSize2() for vertexBuffer in self.vertexBuffers)
+        size += sum(submesh.calculateSize2() for submesh in self.submeshes)
+        return size
+
+    def calculateSize3(self):
+        size = calculateLengthPrefixedStringSize(self.name) + FLOAT32x3.size*2 + FLOAT32.size + UINT32x2.size + UINT32.size
+        size += sum(vertexBuffer.calculateSize2() for vertexBuffer in self.vertexBuffers)
+        size += sum(submesh.calculateSize3() for submesh in self.submeshes)
+        return size
+
+    def calculateBoundBox(self):
+        # Version 2 meshes have no bound box, work it out from the coordinates
+        for vertexBuffer in self.vertexBuffers:
+            if vertexBuffer.bufferType != A3D_VERTEXTYPE_COORDINATE or vertexBuffer.vertexCount == 0:
+                continue
+            data = vertexBuffer.data
+            axes = [data[axis::3] for axis in range(3)]
+            return tuple(max(values) for values in axes), tuple(min(values) for values in axes)
+        return (0.0, 0.0, 0.0), (0.0, 0.0, 0.0)
+
+    def calculateHash(self):
+        # Hash of everything that ends up in the blender mesh, tells reloads which meshes changed
+        contentHash = blake2b(digest_size=16)
+        contentHash.update(self.name.encode("utf8"))
+        for vertexBuffer in self.vertexBuffers:
+            contentHash.update(UINT32x2.pack(vertexBuffer.bufferType, vertexBuffer.vertexCount))
+            contentHash.update(memoryview(vertexBuffer.data).cast("B"))
+        for submesh in self.submeshes:
+            contentHash.update(UINT32x2.pack(submesh.indexCount, 0xFFFF if submesh.materialID == None else submesh.materialID))
+            contentHash.update(memoryview(submesh.indices).cast("B"))
+            contentHash.update(memoryview(submesh.smoothingGroups).cast("B"))
+
+        return contentHash.hexdigest()
+
+    def validate(self, materialCount=None):
+        # Sanity checks of the decoded data, returns a list of problems (empty if the mesh is fine)
+        problems = []
+        for vertexBuffer in self.vertexBuffers:
+            # Any NaN or infinity makes the sum non finite, float32 values can't add up to an overflow in a double
+            if vertexBuffer.bufferType == A3D_VERTEXTYPE_COORDINATE and not isfinite(sum(vertexBuffer.data)):
+                problems.append("coordinates contain NaN or infinite values")
+        for submeshIndex, submesh in enumerate(self.submeshes):
+            problems += [f"submesh {submeshIndex} {problem}" for problem in submesh.validate(self.vertexCount, materialCount)]
+
+        return problems
 
 A3D_VERTEXTYPE_COORDINATE = 1
 A3D_VERTEXTYPE_UV1 = 2
@@ -112,53 +245,194 @@ A3DVertexSize = {
     A3D_VERTEXTYPE_NORMAL2: 3
 }
 class A3DVertexBuffer:
+    __slots__ = ("_data", "bufferType", "vertexCount", "vertexSize", "stream", "offset")
+
     def __init__(self):
-        self.data = []
+        self._data = array("f") # Flat vertex data, vertexSize floats per vertex
         self.bufferType = None
 
-    def read2(self, vertexCount, stream):
-        self.bufferType, = unpackStream("<I", stream)
+        self.vertexCount = 0
+        self.vertexSize = 0
+
+        # Lazy loading, where the vertex data lives in the stream
+        self.stream = None
+        self.offset = 0
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = unpackArrayAt("f", self.vertexCount*self.vertexSize, self.stream, self.offset)
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
+
+    def __getstate__(self):
+        # Pickle an owned copy of the data, views into a file mapping (and the stream) can't be pickled
+        state = {name: getattr(self, name) for name in self.__slots__}
+        state["_data"] = toArray("f", self.data)
+        state["stream"] = None
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def read2(self, vertexCount, stream, lazy=False):
+        self.bufferType, = stream.unpack(UINT32)
         if not (self.bufferType in A3DVertexSize.keys()):
             raise RuntimeError(f"Unknown vertex buffer type: {self.bufferType}")
-        for _ in range(vertexCount):
-            vertexSize = A3DVertexSize[self.bufferType]
-            vertex = unpackStream(f"<{vertexSize}f", stream)
-            self.data.append(vertex)
+        self.vertexCount = vertexCount
+        self.vertexSize = A3DVertexSize[self.bufferType]
+        self.offset = stream.tell()
+        if lazy:
+            # Only remember where the data is, it gets decoded on first access
+            self.stream = stream
+            self._data = None
+            stream.skip(vertexCount*self.vertexSize*4)
+        else:
+            self.data = stream.readArray("f", vertexCount*self.vertexSize)
         
-        print(f"[A3DVertexBuffer data: {len(self.data)} buffer type: {self.bufferType}]")
+        logger.debug("[A3DVertexBuffer data: %s buffer type: %s]", self.vertexCount, self.bufferType)
+
+    def write2(self, stream):
+        stream.write(UINT32.pack(self.bufferType))
+        writeArray("f", self.data, stream)
+
+    def calculateSize2(self):
+        return UINT32.size + self.vertexCount*self.vertexSize*4
+
+    def vertices(self):
+        # Tuple per vertex view of the flat data (the old data layout)
+        return list(zip(*[iter(self.data)]*self.vertexSize))
 
 class A3DSubmesh:
+    __slots__ = ("_indices", "_smoothingGroups", "materialID", "indexCount", "smoothingGroupCount", "stream", "indicesOffset", "smoothingGroupsOffset")
+
     def __init__(self):
-        self.indices = []
-        self.smoothingGroups = []
+        self._indices = array("H")
+        self._smoothingGroups = array("I")
         self.materialID = None
 
         self.indexCount = 0
-
-    def read2(self, stream):
-        self.indexCount, = unpackStream("<I", stream) # This is just the face count so multiply it by 3
+        self.smoothingGroupCount = 0
+
+        # Lazy loading, where the index and smoothing group data lives in the stream
+        self.stream = None
+        self.indicesOffset = 0
+        self.smoothingGroupsOffset = 0
+
+    @property
+    def indices(self):
+        if self._indices is None:
+            self._indices = unpackArrayAt("H", self.indexCount, self.stream, self.indicesOffset)
+        return self._indices
+
+    @indices.setter
+    def indices(self, indices):
+        self._indices = indices
+
+    @property
+    def smoothingGroups(self):
+        if self._smoothingGroups is None:
+            self._smoothingGroups = unpackArrayAt("I", self.smoothingGroupCount, self.stream, self.smoothingGroupsOffset)
+        return self._smoothingGroups
+
+    @smoothingGroups.setter
+    def smoothingGroups(self, smoothingGroups):
+        self._smoothingGroups = smoothingGroups
+
+    def __getstate__(self):
+        state = {name: getattr(self, name) for name in self.__slots__}
+        state["_indices"] = toArray("H", self.indices)
+        state["_smoothingGroups"] = toArray("I", self.smoothingGroups)
+        state["stream"] = None
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def read2(self, stream, lazy=False):
+        self.indexCount, = stream.unpack(UINT32) # This is just the face count so multiply it by 3
+        self.smoothingGroupCount = self.indexCount
         self.indexCount *= 3
-        self.indices = list(unpackStream(f"<{self.indexCount}H", stream))
-        self.smoothingGroups = list(unpackStream(f"<{self.indexCount//3}I", stream))
-        self.materialID, = unpackStream("<H", stream)
+        self.indicesOffset = stream.tell()
+        self.smoothingGroupsOffset = self.indicesOffset + self.indexCount*2
+        if lazy:
+            self.stream = stream
+            self._indices = None
+            self._smoothingGroups = None
+            stream.skip(self.indexCount*2 + self.smoothingGroupCount*4)
+        else:
+            self.indices = stream.readArray("H", self.indexCount)
+            self.smoothingGroups = stream.readArray("I", self.smoothingGroupCount)
+        self.materialID, = stream.unpack(UINT16)
 
         if self.materialID == -1 or self.materialID == 65535:
             self.materialID = None
 
-        print(f"[A3DSubmesh indices: {len(self.indices)} smoothing groups: {len(self.smoothingGroups)} materialID: {self.materialID}]")
+        logger.debug("[A3DSubmesh indices: %s smoothing groups: %s materialID: %s]", self.indexCount, self.smoothingGroupCount, self.materialID)
 
-    def read3(self, stream):
+    def read3(self, stream, lazy=False):
         # Read indices
-        self.indexCount, = unpackStream("<I", stream)
-        self.indices = list(unpackStream(f"<{self.indexCount}H", stream))
+        self.indexCount, = stream.unpack(UINT32)
+        self.indicesOffset = stream.tell()
+        if lazy:
+            self.stream = stream
+            self._indices = None
+            stream.skip(self.indexCount*2)
+        else:
+            self.indices = stream.readArray("H", self.indexCount)
         
         # Padding
-        padding = calculatePadding(self.indexCount*2) # Each index is 2 bytes
-        stream.read(padding)
-
-        print(f"[A3DSubmesh indices: {len(self.indices)} smoothing groups: {len(self.smoothingGroups)} materialID: {self.materialID}]")
+        stream.skip(calculatePadding(self.indexCount*2)) # Each index is 2 bytes
+
+        logger.debug("[A3DSubmesh indices: %s smoothing groups: %s materialID: %s]", self.indexCount, self.smoothingGroupCount, self.materialID)
+
+    def write2(self, stream, materialID=None):
+        if materialID == None:
+            materialID = self.materialID
+        faceCount = self.indexCount // 3
+        stream.write(UINT32.pack(faceCount))
+        writeArray("H", self.indices, stream)
+        smoothingGroups = self.smoothingGroups
+        if len(smoothingGroups) != faceCount:
+            smoothingGroups = array("I", bytes(faceCount*4)) # Version 3 submeshes have none
+        writeArray("I", smoothingGroups, stream)
+        stream.write(UINT16.pack(0xFFFF if materialID == None else materialID))
+
+    def write3(self, stream):
+        stream.write(UINT32.pack(self.indexCount))
+        writeArray("H", self.indices, stream)
+        stream.write(bytes(calculatePadding(self.indexCount*2)))
+
+    def calculateSize2(self):
+        return UINT32.size + self.indexCount*2 + (self.indexCount//3)*4 + UINT16.size
+
+    def calculateSize3(self):
+        return UINT32.size + self.indexCount*2 + calculatePadding(self.indexCount*2)
+
+    def validate(self, vertexCount, materialCount=None):
+        # Whole index buffer checks that run in C through max/map instead of a python loop per triangle
+        problems = []
+        indices = self.indices
+        if len(indices) % 3 != 0:
+            problems.append(f"index count {len(indices)} is not a multiple of 3")
+        if len(indices) != 0 and max(indices) >= vertexCount:
+            problems.append(f"indices go up to {max(indices)} but there are only {vertexCount} vertices")
+        first, second, third = indices[0::3], indices[1::3], indices[2::3]
+        if any(map(eq, first, second)) or any(map(eq, second, third)) or any(map(eq, third, first)):
+            problems.append("has degenerate triangles")
+        if materialCount != None and self.materialID != None and self.materialID >= materialCount:
+            problems.append(f"material ID {self.materialID} out of range (count {materialCount})")
+
+        return problems
 
 class A3DTransform:
+    __slots__ = ("name", "position", "rotation", "scale")
+
     def __init__(self):
         self.name = ""
         self.position = (0.0, 0.0, 0.0)
@@ -166,41 +440,120 @@ class A3DTransform:
         self.scale = (0.0, 0.0, 0.0)
 
     def read2(self, stream):
-        self.position = unpackStream("<3f", stream)
-        self.rotation = unpackStream("<4f", stream)
-        self.scale = unpackStream("<3f", stream)
+        values = stream.unpack(TRANSFORM)
+        self.position = values[0:3]
+        self.rotation = values[3:7]
+        self.scale = values[7:10]
 
-        print(f"[A3DTransform position: {self.position} rotation: {self.rotation} scale: {self.scale}]")
+        logger.debug("[A3DTransform position: %s rotation: %s scale: %s]", self.position, self.rotation, self.scale)
 
     def read3(self, stream):
-        self.name = readLengthPrefixedString(stream)
-        self.position = unpackStream("<3f", stream)
-        self.rotation = unpackStream("<4f", stream)
-        self.scale = unpackStream("<3f", stream)
+        self.name = stream.readLengthPrefixedString()
+        values = stream.unpack(TRANSFORM)
+        self.position = values[0:3]
+        self.rotation = values[3:7]
+        self.scale = values[7:10]
 
-        print(f"[A3DTransform name: {self.name} position: {self.position} rotation: {self.rotation} scale: {self.scale}]")
+        logger.debug("[A3DTransform name: %s position: %s rotation: %s scale: %s]", self.name, self.position, self.rotation, self.scale)
+
+    def write2(self, stream):
+        stream.write(TRANSFORM.pack(*self.position, *self.rotation, *self.scale))
+
+    def write3(self, stream):
+        writeLengthPrefixedString(self.name, stream)
+        stream.write(TRANSFORM.pack(*self.position, *self.rotation, *self.scale))
+
+    def calculateSize2(self):
+        return TRANSFORM.size
+
+    def calculateSize3(self):
+        return calculateLengthPrefixedStringSize(self.name) + TRANSFORM.size
 
 class A3DObject:
+    __slots__ = ("name", "meshID", "transformID", "materialIDs", "materialCount")
+
     def __init__(self):
         self.name = ""
         self.meshID = None
         self.transformID = None
-        self.materialIDs = []
+        self.materialIDs = array("i")
 
         self.materialCount = 0
 
     def read2(self, stream):
-        self.name = readNullTerminatedString(stream)
-        self.meshID, self.transformID = unpackStream("<2I", stream)
+        self.name = stream.readNullTerminatedString()
+        self.meshID, self.transformID = stream.unpack(UINT32x2)
 
-        print(f"[A3DObject name: {self.name} meshID: {self.meshID} transformID: {self.transformID} materialIDs: {len(self.materialIDs)}]")
+        logger.debug("[A3DObject name: %s meshID: %s transformID: %s materialIDs: %s]", self.name, self.meshID, self.transformID, len(self.materialIDs))
 
     def read3(self, stream):
-        self.meshID, self.transformID, self.materialCount = unpackStream("<3I", stream)
+        self.meshID, self.transformID, self.materialCount = stream.unpack(UINT32x3)
 
         # Read material IDs
-        for _ in range(self.materialCount):
-            materialID, = unpackStream("<i", stream)
-            self.materialIDs.append(materialID)
-
-        print(f"[A3DObject name: {self.name} meshID: {self.meshID} transformID: {self.transformID} materialIDs: {len(self.materialIDs)}]")
\ No newline at end of file
+        self.materialIDs = toArray("i", stream.readArray("i", self.materialCount))
+
+        logger.debug("[A3DObject name: %s meshID: %s transformID: %s materialIDs: %s]", self.name, self.meshID, self.transformID, len(self.materialIDs))
+
+    def write2(self, stream):
+        writeNullTerminatedString(self.name, stream)
+        stream.write(UINT32x2.pack(self.meshID, self.transformID))
+
+    def write3(self, stream, materialIDs=None):
+        # materialIDs overrides the object's own
+        if materialIDs == None:
+            materialIDs = self.materialIDs
+        stream.write(UINT32x3.pack(self.meshID, self.transformID, len(materialIDs)))
+        writeArray("i", materialIDs, stream)
+
+    def calculateSize2(self):
+        return calculateNullTerminatedStringSize(self.name) + UINT32x2.size
+
+    def calculateSize3(self, materialIDs=None):
+        if materialIDs == None:
+            materialIDs = self.materialIDs
+        return UINT32x3.size + len(materialIDs)*4
+
+A3D_TRANSFORM_SIZE = 10 # Floats per transform, position (3) rotation (4) scale (3)
+class A3DTransformList:
+    '''
+    Struct of arrays storage for transforms, indexing it returns A3DTransform
+    records built from the arrays so the usual attribute API keeps working
+    '''
+    def __init__(self):
+        self.names = []
+        self.data = array("f") # Flat position, rotation, scale of every transform
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.names)
+        if not (0 <= index < len(self.names)):
+            raise IndexError("transform index out of range")
+
+        base = index * A3D_TRANSFORM_SIZE
+        transform = A3DTransform()
+        transform.name = self.names[index]
+        transform.position = tuple(self.data[base:base+3])
+        transform.rotation = tuple(self.data[base+3:base+7])
+        transform.scale = tuple(self.data[base+7:base+10])
+        return transform
+
+    def __setitem__(self, index, transform):
+        base = index * A3D_TRANSFORM_SIZE
+        self.names[index] = transform.name
+        self.data[base:base+A3D_TRANSFORM_SIZE] = array("f", transform.position + transform.rotation + transform.scale)
+
+    def __iter__(self):
+        for index in range(len(self.names)):
+            yield self[index]
+
+    def append(self, transform):
+        self.names.append(transform.name)
+        self.data.extend(transform.position + transform.rotation + transform.scale)
+
+    def extend(self, names, data):
+        # Bulk append, data holds A3D_TRANSFORM_SIZE floats per name
+        self.names += names
+        self.data += toArray("f", data)
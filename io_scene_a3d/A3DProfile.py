@@ -0,0 +1,106 @@
+'''
+Copyright (c) 2024 Pyogenics <https://github.com/Pyogenics>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+from contextlib import contextmanager
+from time import perf_counter
+import json
+import tracemalloc
+
+class A3DImportReport:
+    '''
+    Where the time of one import went, wall time per stage and per mesh plus
+    the peak python memory of the whole process (every thread, not just the
+    stage) while each stage ran when tracemalloc is tracing
+    '''
+    def __init__(self, filepath=""):
+        self.filepath = filepath
+        self.bytes = 0 # Size of the parsed file
+        self.stages = {} # Stage name -> {"seconds", "calls", "peakBytes"}
+        self.meshes = [] # One record per built mesh
+
+    @contextmanager
+    def stage(self, name):
+        # Stages must not be nested, the allocation peak is reset at the start of each one, tracemalloc counts the allocations of all threads
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            record = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+            record["seconds"] += perf_counter() - start
+            record["calls"] += 1
+            if tracing:
+                _, peak = tracemalloc.get_traced_memory()
+                record["peakBytes"] = max(record.get("peakBytes", 0), peak)
+
+    def addStage(self, name, seconds):
+        # For stages timed elsewhere, e.g. in a worker thread where the allocation peak would be shared with the main thread
+        record = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+        record["seconds"] += seconds
+        record["calls"] += 1
+
+    def addBlockTimings(self, blockTimings):
+        # Data block timings collected by A3D.read
+        for name, seconds in blockTimings.items():
+            self.stages[f"read/{name}"] = {"seconds": seconds, "calls": 1}
+
+    def addMesh(self, name, seconds, vertexCount, triangleCount, finaliseSeconds=0.0):
+        self.meshes.append({
+            "name": name,
+            "seconds": seconds,
+            "finaliseSeconds": finaliseSeconds, # validate and update
+            "vertices": vertexCount,
+            "triangles": triangleCount
+        })
+
+    def getTotalSeconds(self):
+        # Block timings are part of the read stage
+        return sum(record["seconds"] for name, record in self.stages.items() if not ("/" in name))
+
+    def toDict(self):
+        return {
+            "path": self.filepath,
+            "bytes": self.bytes,
+            "seconds": self.getTotalSeconds(),
+            "vertices": sum(mesh["vertices"] for mesh in self.meshes),
+            "triangles": sum(mesh["triangles"] for mesh in self.meshes),
+            "stages": self.stages,
+            "meshes": self.meshes
+        }
+
+    def format(self, slowestCount=5):
+        lines = [f"{self.filepath}: {self.getTotalSeconds()*1000:.2f}ms, {self.bytes} bytes"]
+        for name, record in self.stages.items():
+            line = f"  {name:<20}{record['seconds']*1000:>10.2f}ms"
+            if "peakBytes" in record:
+                line += f" process peak {record['peakBytes']/(1024*1024):.2f}MB"
+            lines.append(line)
+        slowest = sorted(self.meshes, key=lambda mesh: mesh["seconds"], reverse=True)[:slowestCount]
+        for mesh in slowest:
+            lines.append(f"  mesh {mesh['name']!r}: {mesh['seconds']*1000:.2f}ms ({mesh['finaliseSeconds']*1000:.2f}ms validate/update), {mesh['vertices']} vertices, {mesh['triangles']} triangles")
+        return "\n".join(lines)
+
+def dumpReports(reports, filepath):
+    with open(filepath, "w") as file:
+        json.dump([report.toDict() for report in reports], file, indent=4)
@@ -0,0 +1,99 @@
+'''
+Copyright (c) 2024 Pyogenics <https://github.com/Pyogenics>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+import numpy as np
+
+from .A3DObjects import A3D_VERTEXTYPE_COORDINATE
+
+'''
+Lightweight stand-in geometry for meshes, built straight from the parsed
+arrays. Every builder returns (coordinates, faces, face material slots) with
+one row per vertex and per triangle, the material slot is the submesh index
+'''
+
+A3D_PROXY_RESOLUTION = 8 # Clustering cells along the longest side of a mesh
+
+# Corner i of a box is at (low or high x, y, z) picked by bits 0, 1 and 2 of i, the triangles face outwards
+A3D_BOX_FACES = np.array([
+    (0, 2, 3), (0, 3, 1), # -z
+    (4, 5, 7), (4, 7, 6), # +z
+    (0, 1, 5), (0, 5, 4), # -y
+    (2, 6, 7), (2, 7, 3), # +y
+    (0, 4, 6), (0, 6, 2), # -x
+    (1, 3, 7), (1, 7, 5)  # +x
+], dtype=np.int32)
+
+def getBounds(mesh):
+    if mesh.bboxMin != None and mesh.bboxMax != None:
+        bboxMax, bboxMin = mesh.bboxMax, mesh.bboxMin
+    else:
+        bboxMax, bboxMin = mesh.calculateBoundBox()
+    # The order of the version 3 bound box values is not certain, so don't rely on it
+    bboxMax = np.array(bboxMax, dtype=np.float32)
+    bboxMin = np.array(bboxMin, dtype=np.float32)
+    return np.minimum(bboxMin, bboxMax), np.maximum(bboxMin, bboxMax)
+
+def buildBoundsProxy(mesh):
+    low, high = getBounds(mesh)
+    corners = np.array([[(low, high)[(corner >> axis) & 1][axis] for axis in range(3)] for corner in range(8)], dtype=np.float32)
+    return corners, A3D_BOX_FACES.copy(), np.zeros(len(A3D_BOX_FACES), dtype=np.int32)
+
+def buildClusterProxy(mesh, resolution=A3D_PROXY_RESOLUTION):
+    # Vertex clustering: snap vertices to a grid, merge each cell into one vertex and drop the triangles that collapse
+    coordinates = [np.frombuffer(vertexBuffer.data, dtype=np.float32).reshape(-1, 3) for vertexBuffer in mesh.vertexBuffers if vertexBuffer.bufferType == A3D_VERTEXTYPE_COORDINATE]
+    empty = (np.zeros((0, 3), dtype=np.float32), np.zeros((0, 3), dtype=np.int32), np.zeros(0, dtype=np.int32))
+    if len(coordinates) == 0 or len(mesh.submeshes) == 0:
+        return empty
+    coordinates = np.concatenate(coordinates)
+    faces = np.concatenate([np.asarray(submesh.indices[:submesh.indexCount//3*3], dtype=np.int64) for submesh in mesh.submeshes]).reshape(-1, 3)
+    faceMaterials = np.repeat(np.arange(len(mesh.submeshes), dtype=np.int32), [submesh.indexCount//3 for submesh in mesh.submeshes])
+    validFaces = (faces < len(coordinates)).all(axis=1)
+    faces, faceMaterials = faces[validFaces], faceMaterials[validFaces]
+    if len(faces) == 0 or len(coordinates) == 0:
+        return empty
+
+    # Cubic cells sized by the longest side
+    low = coordinates.min(axis=0)
+    cellSize = max(float((coordinates.max(axis=0) - low).max()) / resolution, 1e-6)
+    cells = np.minimum(((coordinates - low) / cellSize).astype(np.int64), resolution - 1)
+    cellIDs = (cells[:, 2]*resolution + cells[:, 1])*resolution + cells[:, 0]
+    _, clusters = np.unique(cellIDs, return_inverse=True)
+    clusters = clusters.ravel()
+
+    # Each cluster vertex sits at the average of the vertices merged into it
+    clusterCount = int(clusters.max()) + 1
+    counts = np.bincount(clusters, minlength=clusterCount)
+    positions = np.stack([np.bincount(clusters, weights=coordinates[:, axis], minlength=clusterCount) for axis in range(3)], axis=1) / np.maximum(counts, 1)[:, None]
+
+    # Drop collapsed triangles and keep one of the triangles that ended up on the same clusters
+    faces = clusters[faces]
+    keep = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])
+    faces, faceMaterials = faces[keep], faceMaterials[keep]
+    if len(faces) == 0:
+        return empty
+    _, firstFaces = np.unique(np.sort(faces, axis=1), axis=0, return_index=True)
+    firstFaces.sort()
+    faces, faceMaterials = faces[firstFaces], faceMaterials[firstFaces]
+
+    # Only keep the clusters the remaining triangles use
+    usedClusters, faces = np.unique(faces, return_inverse=True)
+    return positions[usedClusters].astype(np.float32), faces.reshape(-1, 3).astype(np.int32), faceMaterials
@@ -20,31 +20,170 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 '''
 
-from struct import unpack, calcsize
+from struct import Struct, calcsize
+from array import array
+from sys import byteorder
 
-def unpackStream(format, stream):
-    size = calcsize(format)
-    data = stream.read(size)
-    return unpack(format, data)
+'''
+Precompiled codecs for the fixed size fields used by the block readers
+'''
+UINT16 = Struct("<H")
+UINT16x2 = Struct("<2H")
+UINT32 = Struct("<I")
+UINT32x2 = Struct("<2I")
+UINT32x3 = Struct("<3I")
+FLOAT32 = Struct("<f")
+FLOAT32x3 = Struct("<3f")
+FLOAT32x4 = Struct("<4f")
+TRANSFORM = Struct("<3f4f3f") # Position, rotation, scale
+
+class BufferStream:
+    '''
+    File-like cursor over an in memory buffer (bytes or a mmap), reads return
+    memoryview slices of the buffer instead of copies and fields are decoded in
+    place with precompiled structs. With copyArrays typed reads return owned
+    arrays instead of read only views
+    '''
+    def __init__(self, buffer, position=0, copyArrays=False):
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+        self.position = position
+        self.copyArrays = copyArrays
+
+    def read(self, size=-1):
+        start = self.position
+        end = len(self.view) if size < 0 else min(start + size, len(self.view))
+        self.position = end
+        return self.view[start:end]
+
+    def skip(self, size):
+        self.position += size
+
+    def unpack(self, structure):
+        data = structure.unpack_from(self.view, self.position)
+        self.position += structure.size
+        return data
+
+    def readArray(self, typecode, count):
+        return unpackArray(typecode, count, self)
+
+    def readLengthPrefixedString(self):
+        length, = self.unpack(UINT32)
+        string = str(self.view[self.position:self.position+length], "utf8", errors="ignore")
+        self.position += length + calculatePadding(length)
+        return string
+
+    def readNullTerminatedString(self):
+        end = self.buffer.find(b"\x00", self.position)
+        if end == -1:
+            raise RuntimeError(f"Unterminated string at offset {self.position}")
+        string = str(self.view[self.position:end], "utf8", errors="ignore")
+        self.position = end + 1
+        return string
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.position
+        elif whence == 2:
+            offset += len(self.view)
+        self.position = offset
+        return self.position
+
+def unpackArray(typecode, count, stream):
+    # Read a whole run of little endian values with a single read instead of one unpack per value
+    if isinstance(stream, BufferStream) and byteorder == "little":
+        # Zero copy, the result is a typed view straight into the buffer
+        data = stream.read(count * calcsize(typecode)).cast(typecode)
+        return toArray(typecode, data) if stream.copyArrays else data
+    data = array(typecode)
+    data.frombytes(stream.read(count * data.itemsize))
+    if byteorder == "big":
+        data.byteswap()
+    return data
+
+def unpackArrayAt(typecode, count, stream, offset):
+    # Random access variant of unpackArray for lazily loaded payloads, leaves the stream position alone
+    return unpackArray(typecode, count, BufferStream(stream.buffer, offset, stream.copyArrays))
+
+def toArray(typecode, data):
+    # Owned copy of a typed memoryview, for data that has to outlive (or be pickled without) the buffer it points into
+    if isinstance(data, memoryview):
+        result = array(typecode)
+        result.frombytes(data.cast("B"))
+        return result
+    return data
+
+STRING_CHUNKSIZE = 64
 
 def readNullTerminatedString(stream):
-    string = b""
-    char = stream.read(1)
-    while char != b"\x00":
-        string += char
+    if isinstance(stream, BufferStream):
+        return stream.readNullTerminatedString()
+
+    # Search whole chunks for the terminator instead of reading a byte at a time
+    string = bytearray()
+    if hasattr(stream, "peek"):
+        # Buffered file, look at what is already buffered and only consume up to the terminator
+        while True:
+            chunk = stream.peek(STRING_CHUNKSIZE)
+            if len(chunk) == 0:
+                raise RuntimeError("Unterminated string at end of file")
+            end = chunk.find(b"\x00")
+            if end != -1:
+                string += chunk[:end]
+                stream.read(end + 1)
+                break
+            string += chunk
+            stream.read(len(chunk))
+    elif stream.seekable():
+        # Read ahead and seek back to just after the terminator
+        while True:
+            chunk = stream.read(STRING_CHUNKSIZE)
+            if len(chunk) == 0:
+                raise RuntimeError("Unterminated string at end of file")
+            end = chunk.find(b"\x00")
+            if end != -1:
+                string += chunk[:end]
+                stream.seek(end + 1 - len(chunk), 1)
+                break
+            string += chunk
+    else:
         char = stream.read(1)
-    return string.decode("utf8", errors="ignore")
+        while char != b"\x00":
+            if len(char) == 0:
+                raise RuntimeError("Unterminated string at end of file")
+            string += char
+            char = stream.read(1)
+
+    return str(string, "utf8", errors="ignore")
 
 def calculatePadding(length):
     # (it basically works with rounding)
     paddingSize = (((length + 3) // 4) * 4) - length
     return paddingSize
 
-def readLengthPrefixedString(stream):
-    length, = unpackStream("<I", stream)
-    string = stream.read(length)
+def calculateNullTerminatedStringSize(string):
+    return len(string.encode("utf8")) + 1
+
+def calculateLengthPrefixedStringSize(string):
+    length = len(string.encode("utf8"))
+    return 4 + length + calculatePadding(length)
+
+def writeNullTerminatedString(string, stream):
+    stream.write(string.encode("utf8") + b"\x00")
 
-    paddingSize = calculatePadding(length)
-    stream.read(paddingSize)
+def writeLengthPrefixedString(string, stream):
+    data = string.encode("utf8")
+    stream.write(UINT32.pack(len(data)))
+    stream.write(data)
+    stream.write(bytes(calculatePadding(len(data))))
 
-    return string.decode("utf8", errors="ignore")
\ No newline at end of file
+def writeArray(typecode, data, stream):
+    # Write typed data as little endian values with a single write
+    if not isinstance(data, (array, memoryview)) or byteorder == "big":
+        data = array(typecode, data)
+        if byteorder == "big":
+            data.byteswap()
+    stream.write(memoryview(data).cast("B"))